@@ -1,50 +1,254 @@
 """
 Letterboxd Wrapped 2.0 - Complete Cinematic Year in Review
-Uses Selenium for full JavaScript rendering to capture all data
+Scrapes the year page over plain HTTP, with Selenium as the full-render fallback
 """
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, g, redirect, render_template, jsonify, request, stream_with_context
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound, Tag
+import atexit
+import json
+import os
+import queue
+import random
 import re
+import threading
 import time
 import concurrent.futures
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+
+# Selenium and webdriver-manager are imported where a browser is first needed,
+# so workers that only ever scrape over HTTP never load them
+from cache import ResultCache
+from driver_pool import DriverCheckoutCancelled, DriverPool
+from http_client import HttpClient
+from jobs import JOB_WORKERS, JobManager
+from compare import compare_results
+from summaries import YearSummaryStore, merge_summaries, summarize_year
+from diary import DiaryStore, viewing_key
+from films import FilmColumns
+from filmindex import FilmIndex
+from posters import CONTENT_TYPES, POSTER_WIDTHS, PosterCache, canonical_poster_url, is_poster_url
+from sharecard import CARD_FORMATS, ShareCards
+from metrics import Registry
+from ratelimit import BACKGROUND, BATCH, RateLimiter, submit_with_context
+from refresh import RefreshScheduler
+from startup import StartupTimes
+from chrome_profile import CHROME_PROFILE, apply_profile, chrome_options, page_weight
 
 app = Flask(__name__)
+
+# Cold-start timings for this worker, reported by /api/health and /metrics
+startup = StartupTimes()
+
+# Prometheus metrics, served at /metrics
+metrics = Registry()
+stage_seconds = metrics.histogram(
+    'wrapped_stage_seconds', 'Time spent in each stage of building a wrapped result', ['stage'])
+request_seconds = metrics.histogram(
+    'wrapped_http_request_seconds', 'Time to answer an API request (to the first byte for streams)',
+    ['endpoint', 'status'])
+selenium_page_bytes = metrics.histogram(
+    'wrapped_selenium_page_bytes', 'Bytes transferred rendering a year page in Chrome, by CHROME_PROFILE',
+    ['profile'], buckets=tuple(2 ** n * 1024 for n in range(5, 15)))
 CORS(app)
 
-# Cache for selenium driver
-_driver = None
-
-def get_driver():
-    """Get or create a headless Chrome driver"""
-    global _driver
-    if _driver is None:
-        options = Options()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-        
-        # Use pre-installed ChromeDriver if available (Docker), otherwise use webdriver-manager
-        import os
-        chromedriver_path = os.environ.get('CHROMEDRIVER_PATH', '/usr/local/bin/chromedriver')
-        if os.path.exists(chromedriver_path):
-            service = Service(chromedriver_path)
-        else:
-            service = Service(ChromeDriverManager().install())
-        _driver = webdriver.Chrome(service=service, options=options)
-    return _driver
+# Tiered (memory + SQLite) cache of finished wrapped results
+result_cache = ResultCache()
+
+# Immutable per-year summaries behind the multi-year view
+year_summaries = YearSummaryStore()
+
+# Rated entries per user and year; refreshes only fetch the reviews pages newer than what is stored
+diary_store = DiaryStore()
+DIARY_SYNC = os.environ.get('DIARY_SYNC', '1').lower() not in ('0', 'false', 'no')
+
+# Pre-installed ChromeDriver (Docker); anything else is downloaded once, at boot
+CHROMEDRIVER_PATH = os.environ.get('CHROMEDRIVER_PATH', '/usr/local/bin/chromedriver')
+chromedriver = None
+chromedriver_lock = threading.Lock()
+
+def resolve_chromedriver():
+    """Path to chromedriver, settled once per process
+    
+    Only falls back to webdriver-manager (which needs the network) when
+    CHROMEDRIVER_PATH is missing. warm_up() calls this at boot, so no request
+    waits on a download; a failed download is not retried per request.
+    """
+    global chromedriver
+    with chromedriver_lock:
+        if chromedriver is None:
+            if os.path.exists(CHROMEDRIVER_PATH):
+                chromedriver = CHROMEDRIVER_PATH
+            else:
+                from webdriver_manager.chrome import ChromeDriverManager
+                started = time.perf_counter()
+                try:
+                    chromedriver = ChromeDriverManager().install()
+                except Exception:
+                    chromedriver = ''
+                    raise
+                print(f"Downloaded ChromeDriver in {time.perf_counter() - started:.1f}s: {chromedriver}")
+        if not chromedriver:
+            raise RuntimeError('No ChromeDriver: CHROMEDRIVER_PATH is missing and the download failed')
+        return chromedriver
+
+def create_driver():
+    """Launch a new headless Chrome driver with the CHROME_PROFILE settings"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    
+    service = Service(resolve_chromedriver())
+    driver = webdriver.Chrome(service=service, options=chrome_options())
+    apply_profile(driver)
+    return driver
+
+# Bounded pool of Chrome instances - one per concurrent scrape
+driver_pool = DriverPool(create_driver)
+# Browsers each worker launches at boot (see warm_up), so no request pays for a Chrome start
+DRIVER_PREWARM = int(os.environ.get('DRIVER_PREWARM', '1'))
+atexit.register(driver_pool.shutdown)
+
+# Overridable so benchmarks can point the scrapers at a local stand-in server
+LETTERBOXD_URL = os.environ.get('LETTERBOXD_URL', 'https://letterboxd.com').rstrip('/')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# BeautifulSoup tree builder: 'lxml' (C parser, much faster) or 'html.parser'
+HTML_PARSER = os.environ.get('HTML_PARSER', 'lxml')
+try:
+    BeautifulSoup('', HTML_PARSER)
+except FeatureNotFound:
+    print(f"HTML parser '{HTML_PARSER}' is not installed, using html.parser")
+    HTML_PARSER = 'html.parser'
+
+# Fraction of parses to re-run on the full-tree html.parser reference and compare
+PARSER_PARITY_SAMPLE = float(os.environ.get('PARSER_PARITY_SAMPLE', '0'))
+parser_parity = {'checked': 0, 'mismatches': 0}
+parser_parity_lock = threading.Lock()
+
+# Every letterboxd.com request and Selenium navigation waits on this token bucket,
+# interactive requests first; a 429 slows the whole process down
+outbound_limiter = RateLimiter()
+# A navigation pulls in the page's scripts and XHRs too, so it costs more than one page GET
+SELENIUM_NAVIGATION_COST = float(os.environ.get('SELENIUM_NAVIGATION_COST', '3'))
+
+# One pooled, retrying, revalidating client for every letterboxd.com request
+http_client = HttpClient(headers=HEADERS, limiter=outbound_limiter)
+
+# Resized, re-encoded posters served from our own disk cache
+poster_cache = PosterCache(http_client.get_bytes)
+POSTER_MAX_AGE = int(os.environ.get('POSTER_MAX_AGE', str(365 * 24 * 3600)))
+
+# Server-rendered share cards, drawn with posters from the proxy cache
+share_cards = ShareCards(lambda url: poster_cache.get(url, 230, 'jpeg')[1] if is_poster_url(url) else None)
+SHARE_CARD_MAX_AGE = int(os.environ.get('SHARE_CARD_MAX_AGE', '3600'))
+
+# Reviews pages are fetched concurrently over the shared client
+REVIEWS_FETCH_WORKERS = int(os.environ.get('REVIEWS_FETCH_WORKERS', '4'))
+reviews_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=REVIEWS_FETCH_WORKERS, thread_name_prefix='reviews'
+)
+
+# The profile, year page and reviews stages of every wrapped build run here
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', str(3 * JOB_WORKERS)))
+stage_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=STAGE_WORKERS, thread_name_prefix='wrapped-stage'
+)
+
+# Lazily-loaded year page fragments are fetched here, shared by every year page scrape
+FRAGMENT_FETCH_WORKERS = int(os.environ.get('FRAGMENT_FETCH_WORKERS', str(4 * JOB_WORKERS)))
+fragment_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=FRAGMENT_FETCH_WORKERS, thread_name_prefix='year-fragments'
+)
+
+# Year page engine: 'http' (plain requests), 'selenium' (full Chrome render),
+# or 'auto' (try http, fall back to selenium when the result is incomplete)
+YEAR_PAGE_ENGINE = os.environ.get('YEAR_PAGE_ENGINE', 'auto').lower()
+
+# Upper bound on waiting for the rendered year page, and how long to wait for
+# optional sections once the stats are in and the document has finished loading
+SELENIUM_READY_TIMEOUT = float(os.environ.get('SELENIUM_READY_TIMEOUT', '10'))
+SELENIUM_SETTLE_GRACE = float(os.environ.get('SELENIUM_SETTLE_GRACE', '0.75'))
+
+# Sections the year page parser reads: stats, highest rated, genre breakdown
+YEAR_PAGE_READY_SELECTORS = [
+    '.yir-member-statistic, .yir-statistic',
+    '.yir-highest-rated, section[data-section="highest-rated"]',
+    '.yir-genres, .film-breakdown-graph',
+]
+
+YEAR_PAGE_STATE_SCRIPT = """
+const selectors = arguments[0];
+const title = document.title.toLowerCase();
+if (title.includes('not found') || document.querySelector('body.error, .error-page')) {
+    return {missing: true};
+}
+const body = document.body ? document.body.textContent : '';
+if (body.includes('profile is private') || body.includes('content is private')) {
+    return {missing: true};
+}
+return {
+    found: selectors.map(sel => document.querySelector(sel) !== null),
+    complete: document.readyState === 'complete'
+};
+"""
+
+def _has_class(attrs, *names):
+    classes = (attrs.get('class') or '').split()
+    return any(name in classes for name in names)
+
+# Only the regions each parser reads get built into a tree
+PARSE_REGIONS = {
+    'reviews': SoupStrainer(lambda name, attrs: (
+        (name == 'div' and _has_class(attrs, 'listitem'))
+        or _has_class(attrs, 'paginate-pages', 'paginate-nextprev')
+    )),
+    'year': SoupStrainer(lambda name, attrs: (
+        attrs.get('id') == 'content'
+        or _has_class(attrs, 'avatar', 'profile-avatar', 'displayname', 'yir-header')
+    )),
+    'film': SoupStrainer(lambda name, attrs: (
+        (name == 'script' and attrs.get('type') == 'application/ld+json')
+        or (name == 'p' and _has_class(attrs, 'text-footer'))
+        or attrs.get('id') in ('tab-genres', 'tab-crew')
+        or _has_class(attrs, 'releaseyear', 'releasedate')
+    )),
+    'profile': SoupStrainer(lambda name, attrs: (
+        name == 'img'
+        or (name == 'span' and _has_class(attrs, 'displayname'))
+        or (name == 'h4' and _has_class(attrs, 'profile-statistic'))
+        or (name == 'section' and _has_class(attrs, 'ratings-histogram-chart'))
+    )),
+}
+
+def make_soup(html, region=None):
+    """Parse with the configured backend, restricted to a PARSE_REGIONS entry when given"""
+    strainer = PARSE_REGIONS.get(region)
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=strainer)
+    if strainer is not None and not soup.contents:
+        # Markup without the expected containers - fall back to the whole page
+        soup = BeautifulSoup(html, HTML_PARSER)
+    return soup
+
+def check_parser_parity(result, html, parse, *args):
+    """On a sample of parses, compare against the full-tree html.parser reference"""
+    if not PARSER_PARITY_SAMPLE or random.random() >= PARSER_PARITY_SAMPLE:
+        return
+    reference = parse(BeautifulSoup(html, 'html.parser'), *args)
+    if isinstance(result, dict):
+        # Timings legitimately differ between runs
+        result = {k: v for k, v in result.items() if k != 'timings'}
+        reference = {k: v for k, v in reference.items() if k != 'timings'}
+    with parser_parity_lock:
+        parser_parity['checked'] += 1
+        if reference != result:
+            parser_parity['mismatches'] += 1
+    if reference != result:
+        keys = sorted(k for k in set(reference) | set(result) if reference.get(k) != result.get(k)) \
+            if isinstance(reference, dict) else []
+        print(f"Parser parity mismatch in {parse.__name__} ({HTML_PARSER}): {keys or 'value differs'}")
 
 def get_poster_url(film_id, slug, size=500):
     """Construct poster URL from film ID and slug"""
@@ -54,73 +258,153 @@ def get_poster_url(film_id, slug, size=500):
     id_path = '/'.join(list(id_str))
     return f"https://a.ltrbxd.com/resized/film-poster/{id_path}/{film_id}-{slug}-0-{size}-0-{int(size*1.5)}-crop.jpg"
 
-def scrape_all_rated_films(username, year):
-    """Scrape ALL rated films from user's reviews page with pagination"""
-    all_films = []
-    page = 1
-    max_pages = 10
+def reviews_page_url(username, year, page):
+    # Use reviews page - has all films with ratings and reviews for the year
+    if page == 1:
+        return f"{LETTERBOXD_URL}/{username}/reviews/films/for/{year}/"
+    return f"{LETTERBOXD_URL}/{username}/reviews/films/for/{year}/page/{page}/"
+
+def parse_reviews_page(soup):
+    """Extract rated films from one reviews page"""
+    films = []
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    # Reviews page uses div.listitem with article.production-viewing
+    for entry in soup.select('div.listitem article.production-viewing'):
+        film = {}
+        
+        # Each logged viewing has its own id, so rewatches are separate entries
+        object_id = entry.get('data-object-id', '')
+        if object_id.startswith('viewing:'):
+            film['viewing_id'] = object_id.split(':', 1)[1]
+        
+        # Get film data from the figure div with data attributes
+        figure = entry.select_one('div.react-component.figure')
+        if figure:
+            film['film_id'] = figure.get('data-film-id', '')
+            film['slug'] = figure.get('data-item-slug', '')
+            film['title'] = figure.get('data-item-name', '')
+            if film['film_id'] and film['slug']:
+                film['poster'] = get_poster_url(film['film_id'], film['slug'])
+        
+        # Rating span has class like "rated-10" (10 = 5 stars)
+        rating_span = entry.select_one('span.rating')
+        if rating_span:
+            classes = rating_span.get('class', [])
+            for cls in classes:
+                if cls.startswith('rated-'):
+                    try:
+                        rating_val = int(cls.replace('rated-', ''))
+                        film['rating'] = rating_val / 2
+                    except ValueError:
+                        pass
+            film['stars'] = rating_span.get_text(strip=True)
+        
+        # Watch date, for the per-month counts
+        watched = entry.select_one('time[datetime]')
+        if watched:
+            film['watched'] = watched.get('datetime', '')[:10]
+        
+        if film.get('title') and film.get('rating'):
+            films.append(film)
+    
+    return films
+
+def last_page_number(soup):
+    """Highest page number listed in the paginator (1 when there is no paginator)"""
+    pages = [
+        int(link.get_text(strip=True))
+        for link in soup.select('.paginate-pages li a, .paginate-pages li span')
+        if link.get_text(strip=True).isdigit()
+    ]
+    return max(pages, default=1)
+
+def parse_reviews_html(html):
+    """Parse a reviews page into its films plus what the paginator says"""
+    soup = make_soup(html, 'reviews')
+    films = parse_reviews_page(soup)
+    check_parser_parity(films, html, parse_reviews_page)
+    return {
+        'films': films,
+        'last_page': last_page_number(soup),
+        'has_next': soup.select_one('.paginate-nextprev a.next') is not None,
     }
+
+def is_cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+def fetch_reviews_page(username, year, page, cancel=None):
+    """Fetch and parse one reviews page. Returns the parse_reviews_html dict, or None on failure"""
+    if is_cancelled(cancel):
+        return None
+    url = reviews_page_url(username, year, page)
+    print(f"Scraping reviews page {page}: {url}")
+    with stage_seconds.time(stage='reviews_page'):
+        status, listing = http_client.get_parsed(url, parse_reviews_html)
+    if status != 200:
+        return None
+    print(f"Found {len(listing['films'])} rated films on page {page}")
+    return listing
+
+def iter_rated_film_pages(username, year, cancel=None, missed=None):
+    """Yield each reviews page's rated films in page order
     
-    try:
-        while page <= max_pages:
-            # Use reviews page - has all films with ratings and reviews for the year
-            if page == 1:
-                url = f"https://letterboxd.com/{username}/reviews/films/for/{year}/"
-            else:
-                url = f"https://letterboxd.com/{username}/reviews/films/for/{year}/page/{page}/"
-            
-            print(f"Scraping reviews page {page}: {url}")
-            response = requests.get(url, headers=headers, timeout=15)
-            
-            if response.status_code != 200:
-                break
-                
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Reviews page uses div.listitem with article.production-viewing
-            entries = soup.select('div.listitem article.production-viewing')
-            print(f"Found {len(entries)} review entries on page {page}")
-            
-            if not entries:
-                break
-            
-            for entry in entries:
-                film = {}
-                
-                # Get film data from the figure div with data attributes
-                figure = entry.select_one('div.react-component.figure')
-                if figure:
-                    film['film_id'] = figure.get('data-film-id', '')
-                    film['slug'] = figure.get('data-item-slug', '')
-                    film['title'] = figure.get('data-item-name', '')
-                    if film['film_id'] and film['slug']:
-                        film['poster'] = get_poster_url(film['film_id'], film['slug'])
-                
-                # Rating span has class like "rated-10" (10 = 5 stars)
-                rating_span = entry.select_one('span.rating')
-                if rating_span:
-                    classes = rating_span.get('class', [])
-                    for cls in classes:
-                        if cls.startswith('rated-'):
-                            try:
-                                rating_val = int(cls.replace('rated-', ''))
-                                film['rating'] = rating_val / 2
-                            except ValueError:
-                                pass
-                    film['stars'] = rating_span.get_text(strip=True)
-                
-                if film.get('title') and film.get('rating'):
-                    all_films.append(film)
-            
-            # Check for next page
-            next_link = soup.select_one('.paginate-nextprev a.next')
-            if not next_link:
-                break
-            
+    Page 1 tells us the last page from the paginator, the rest are fetched
+    concurrently and yielded in order as soon as each one is ready. Setting
+    cancel stops the walk after the page in hand. Pages that could not be
+    fetched are skipped, and their numbers appended to missed when given.
+    """
+    missed = missed if missed is not None else []
+    listing = fetch_reviews_page(username, year, 1, cancel)
+    if listing is None:
+        missed.append(1)
+        return
+    yield listing['films']
+    
+    last_page = listing['last_page']
+    if last_page == 1 and listing['has_next']:
+        # No numbered paginator - walk the next links one page at a time
+        page = 2
+        while True:
+            listing = fetch_reviews_page(username, year, page, cancel)
+            if listing is None:
+                missed.append(page)
+            if not listing or not listing['films']:
+                return
+            yield listing['films']
+            if not listing['has_next']:
+                return
             page += 1
+    
+    futures = [
+        submit_with_context(reviews_executor, fetch_reviews_page, username, year, page, cancel)
+        for page in range(2, last_page + 1)
+    ]
+    try:
+        for page, future in enumerate(futures, start=2):
+            if is_cancelled(cancel):
+                return
+            try:
+                listing = future.result()
+            except Exception as e:
+                print(f"Error scraping reviews page {page}: {e}")
+                missed.append(page)
+                continue
+            if listing is None:
+                missed.append(page)
+            elif listing['films']:
+                yield listing['films']
+    finally:
+        # Consumer stopped early - don't fetch pages nobody will read
+        for future in futures:
+            future.cancel()
+
+def scrape_all_rated_films(username, year, cancel=None):
+    """Scrape ALL rated films from user's reviews page with pagination"""
+    all_films = []
+    
+    try:
+        for films in iter_rated_film_pages(username, year, cancel):
+            all_films.extend(films)
         
         print(f"Total rated films found: {len(all_films)}")
         return all_films
@@ -129,11 +413,62 @@ def scrape_all_rated_films(username, year):
         print(f"Error scraping rated films: {e}")
         return all_films
 
-def scrape_with_selenium(username, year):
-    """Use Selenium to scrape the fully-rendered year page"""
-    url = f"https://letterboxd.com/{username}/year/{year}/"
+def sync_rated_films(username, year, cancel=None):
+    """Bring the stored diary for a user's year up to date and return its rated films, newest first
     
-    data = {
+    A year never synced (or not fully within DIARY_FULL_SYNC_AGE) is walked
+    in full, concurrently. Otherwise reviews pages are fetched newest first
+    and the walk stops at the first page holding an entry already stored, so
+    a refresh costs about one page per page of new entries.
+    """
+    fetched = []
+    try:
+        if diary_store.needs_full_sync(username, year):
+            missed = []
+            for page_films in iter_rated_film_pages(username, year, cancel, missed):
+                fetched.extend(page_films)
+            if missed or is_cancelled(cancel):
+                # Incomplete walk - use it for this result but don't store the gaps
+                return fetched
+            diary_store.replace(username, year, fetched)
+            print(f"Diary full sync for {username}/{year}: {len(fetched)} entries")
+            return fetched
+        
+        page = 1
+        while True:
+            listing = fetch_reviews_page(username, year, page, cancel)
+            if listing is None:
+                # Storing the pages before a gap would hide it from every later sync
+                return with_stored_diary(username, year, fetched)
+            fetched.extend(listing['films'])
+            if diary_store.known(username, year, listing['films']):
+                break
+            if not listing['films'] or page >= listing['last_page'] and not listing['has_next']:
+                break
+            page += 1
+        
+        new = diary_store.merge(username, year, fetched)
+        print(f"Diary sync for {username}/{year}: {new} new entries from {page} page(s)")
+        return diary_store.films(username, year)
+    
+    except Exception as e:
+        # Like a gap: this result gets whatever is stored plus the pages already fetched
+        print(f"Error syncing rated films: {e}")
+        return with_stored_diary(username, year, fetched)
+
+def with_stored_diary(username, year, fetched):
+    """Fetched films followed by the stored entries they don't already cover, without storing anything"""
+    try:
+        stored = diary_store.films(username, year)
+    except Exception as e:
+        print(f"Error reading stored diary: {e}")
+        stored = []
+    keys = {viewing_key(film) for film in fetched}
+    return fetched + [film for film in stored if viewing_key(film) not in keys]
+
+def new_year_data(username, year):
+    """Empty year-page result - every engine fills this same shape"""
+    return {
         'username': username,
         'display_name': username,
         'profile_pic': '',
@@ -150,353 +485,661 @@ def scrape_with_selenium(username, year):
         'actors': [],
         'milestones': {},
         'rating_spread': {},
-        'films_list': []
+        'films_list': [],
+        'timings': {}
     }
+
+HIGHS_LOWS_LABELS = [
+    ('most popular', 'most_popular'),
+    ('most obscure', 'most_obscure'),
+    ('longest', 'longest'),
+    ('shortest', 'shortest'),
+    ('newest', 'newest'),
+    ('oldest', 'oldest'),
+]
+
+def walk_tags(root):
+    """Yield (tag, entering) for every tag under root in document order, entering then leaving"""
+    yield root, True
+    stack = [(root, iter(root.children))]
+    while stack:
+        tag, children = stack[-1]
+        for child in children:
+            if isinstance(child, Tag):
+                yield child, True
+                stack.append((child, iter(child.children)))
+                break
+        else:
+            stack.pop()
+            yield tag, False
+
+def apply_stat_item(item, data):
+    """Read one '65 Diary Entries' style stat block into data"""
+    # Get value and definition from spans
+    value_span = item.select_one('span.value')
+    def_span = item.select_one('span.definition')
     
-    try:
-        driver = get_driver()
-        driver.get(url)
-        
-        # Wait for page to load (reduced from 3s to 1.5s)
-        time.sleep(1.5)
+    if value_span and def_span:
+        try:
+            num = float(value_span.get_text(strip=True).replace(',', ''))
+            definition = def_span.get_text(strip=True).lower()
+            
+            if 'diary' in definition or 'entries' in definition:
+                data['films_logged'] = int(num)
+            elif 'hour' in definition:
+                data['hours_watched'] = num
+            elif 'review' in definition:
+                data['reviews'] = int(num)
+            elif 'like' in definition:
+                data['likes'] = int(num)
+        except ValueError:
+            pass
+    else:
+        # Fallback: extract from text
+        text = item.get_text(strip=True).lower()
+        num_match = re.search(r'([\d,.]+)', text)
+        if num_match:
+            try:
+                num = float(num_match.group(1).replace(',', ''))
+                if 'diary' in text or 'entries' in text:
+                    data['films_logged'] = int(num)
+                elif 'hour' in text:
+                    data['hours_watched'] = num
+                elif 'review' in text:
+                    data['reviews'] = int(num)
+                elif 'like' in text:
+                    data['likes'] = int(num)
+            except ValueError:
+                pass
+
+def link_with_count(link):
+    """(name, count) for a genre/country link whose parent reads like 'Drama 12 films'"""
+    name = link.get_text(strip=True)
+    count_text = link.parent.get_text(strip=True)
+    count_match = re.search(r'(\d+)\s*films?', count_text, re.I)
+    return name, int(count_match.group(1)) if count_match else 0
+
+def extract_highest_rated(section, data):
+    for item in section.select('li')[:12]:
+        film = {}
         
-        # Get page source after JS rendering
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        # Get from data attributes
+        poster_div = item.select_one('div[data-film-id]')
+        if poster_div:
+            film['title'] = poster_div.get('data-film-name', poster_div.get('data-item-name', ''))
+            film['film_id'] = poster_div.get('data-film-id', '')
+            film['slug'] = poster_div.get('data-film-slug', poster_div.get('data-item-slug', ''))
+            film['poster'] = get_poster_url(film['film_id'], film['slug'])
         
-        # === PROFILE INFO ===
-        profile_link = soup.select_one('a.avatar img, .profile-avatar img')
-        if profile_link:
-            data['profile_pic'] = profile_link.get('src', '')
+        # Get rating
+        rating_span = item.select_one('.rating')
+        if rating_span:
+            film['stars'] = rating_span.get_text(strip=True)
+            # Count stars
+            full = film['stars'].count('★')
+            half = 0.5 if '½' in film['stars'] else 0
+            film['rating'] = full + half
         
-        display_name = soup.select_one('.displayname, .yir-header .displayname')
-        if display_name:
-            data['display_name'] = display_name.get_text(strip=True)
+        # Fallback: get title from alt text
+        if not film.get('title'):
+            img = item.select_one('img')
+            if img:
+                alt = img.get('alt', '')
+                film['title'] = re.sub(r'^Poster for ', '', alt)
         
-        # === MAIN STATS ===
-        # Look for stat blocks in yir-member-stats (65 Diary Entries, 119.3 Hours, etc.)
-        stat_items = soup.select('.yir-member-statistic, .yir-statistic, .profile-stats li')
+        if film.get('title'):
+            data['top_films'].append(film)
+
+def extract_genre_breakdown(section, data, seen):
+    for bar in section.select('.film-breakdown-graph-bar, a[href*="/genre/"]'):
+        label = bar.select_one('.film-breakdown-graph-bar-label, a')
+        count_elem = bar.select_one('.film-breakdown-graph-bar-value span, span')
         
-        for item in stat_items:
-            # Get value and definition from spans
-            value_span = item.select_one('span.value')
-            def_span = item.select_one('span.definition')
+        if label:
+            name = label.get_text(strip=True)
+            count = 0
+            if count_elem:
+                count_text = count_elem.get_text(strip=True)
+                count_match = re.search(r'(\d+)', count_text)
+                if count_match:
+                    count = int(count_match.group(1))
             
-            if value_span and def_span:
-                try:
-                    num = float(value_span.get_text(strip=True).replace(',', ''))
-                    definition = def_span.get_text(strip=True).lower()
-                    
-                    if 'diary' in definition or 'entries' in definition:
-                        data['films_logged'] = int(num)
-                    elif 'hour' in definition:
-                        data['hours_watched'] = num
-                    elif 'review' in definition:
-                        data['reviews'] = int(num)
-                    elif 'like' in definition:
-                        data['likes'] = int(num)
-                except ValueError:
-                    pass
-            else:
-                # Fallback: extract from text
-                text = item.get_text(strip=True).lower()
-                num_match = re.search(r'([\d,.]+)', text)
-                if num_match:
-                    try:
-                        num = float(num_match.group(1).replace(',', ''))
-                        if 'diary' in text or 'entries' in text:
-                            data['films_logged'] = int(num)
-                        elif 'hour' in text:
-                            data['hours_watched'] = num
-                        elif 'review' in text:
-                            data['reviews'] = int(num)
-                        elif 'like' in text:
-                            data['likes'] = int(num)
-                    except ValueError:
-                        pass
+            if name and len(name) < 30 and name not in seen:
+                seen.add(name)
+                data['genres'].append({'name': name, 'count': count})
+
+def extract_themes(section, data):
+    for item in section.select('li')[:5]:
+        link = item.select_one('a')
+        if link:
+            text = link.get_text(strip=True)
+            # Split into theme name and count
+            match = re.match(r'(.+?)\s*(\d+)\s*films?', text, re.I)
+            if match:
+                data['themes'].append({
+                    'name': match.group(1).strip(),
+                    'count': int(match.group(2))
+                })
+
+def extract_milestones(section, data):
+    for item in section.select('.yir-milestone, li'):
+        title_elem = item.select_one('.title, h4')
+        poster_elem = item.select_one('div[data-film-name]')
+        date_elem = item.select_one('.date, time')
         
-        # === HIGHEST RATED FILMS ===
-        highest_section = soup.select_one('.yir-highest-rated, section[data-section="highest-rated"]')
-        if highest_section:
-            for item in highest_section.select('li')[:12]:
-                film = {}
-                
-                # Get from data attributes
-                poster_div = item.select_one('div[data-film-id]')
-                if poster_div:
-                    film['title'] = poster_div.get('data-film-name', poster_div.get('data-item-name', ''))
-                    film['film_id'] = poster_div.get('data-film-id', '')
-                    film['slug'] = poster_div.get('data-film-slug', poster_div.get('data-item-slug', ''))
-                    film['poster'] = get_poster_url(film['film_id'], film['slug'])
-                
-                # Get rating
-                rating_span = item.select_one('.rating')
-                if rating_span:
-                    film['stars'] = rating_span.get_text(strip=True)
-                    # Count stars
-                    full = film['stars'].count('★')
-                    half = 0.5 if '½' in film['stars'] else 0
-                    film['rating'] = full + half
-                
-                # Fallback: get title from alt text
-                if not film.get('title'):
-                    img = item.select_one('img')
-                    if img:
-                        alt = img.get('alt', '')
-                        film['title'] = re.sub(r'^Poster for ', '', alt)
+        if title_elem:
+            milestone_type = title_elem.get_text(strip=True).lower()
+            if poster_elem:
+                film_name = poster_elem.get('data-film-name', '')
+                film_id = poster_elem.get('data-film-id', '')
+                slug = poster_elem.get('data-film-slug', '')
+                date = date_elem.get_text(strip=True) if date_elem else ''
                 
-                if film.get('title'):
-                    data['top_films'].append(film)
-        
-        # === GENRES ===
-        # Look for genre breakdown
-        genre_section = soup.select_one('.yir-genres, .film-breakdown-graph')
-        if genre_section:
-            for bar in genre_section.select('.film-breakdown-graph-bar, a[href*="/genre/"]'):
-                label = bar.select_one('.film-breakdown-graph-bar-label, a')
-                count_elem = bar.select_one('.film-breakdown-graph-bar-value span, span')
-                
-                if label:
-                    name = label.get_text(strip=True)
-                    count = 0
-                    if count_elem:
-                        count_text = count_elem.get_text(strip=True)
-                        count_match = re.search(r'(\d+)', count_text)
-                        if count_match:
-                            count = int(count_match.group(1))
-                    
-                    if name and len(name) < 30 and name not in [g['name'] for g in data['genres']]:
-                        data['genres'].append({'name': name, 'count': count})
-        
-        # Fallback: Extract from href patterns
-        if not data['genres']:
-            for link in soup.select(f'a[href*="/{username}/diary/for/{year}/genre/"]'):
-                name = link.get_text(strip=True)
-                # Find sibling with count
-                parent = link.parent
-                if parent:
-                    count_text = parent.get_text(strip=True)
-                    count_match = re.search(r'(\d+)\s*films?', count_text, re.I)
-                    count = int(count_match.group(1)) if count_match else 0
-                    
-                    if name and len(name) < 30 and name not in [g['name'] for g in data['genres']]:
-                        data['genres'].append({'name': name, 'count': count})
-        
-        # === COUNTRIES ===
-        for link in soup.select(f'a[href*="/{username}/diary/for/{year}/country/"]'):
-            name = link.get_text(strip=True)
-            parent = link.parent
-            if parent:
-                count_text = parent.get_text(strip=True)
-                count_match = re.search(r'(\d+)\s*films?', count_text, re.I)
-                count = int(count_match.group(1)) if count_match else 0
-                
-                if name and len(name) < 30 and name not in [c['name'] for c in data['countries']]:
-                    data['countries'].append({'name': name, 'count': count})
-        
-        # === THEMES ===
-        themes_section = soup.select_one('.yir-themes, section[data-section="themes"]')
-        if themes_section:
-            for item in themes_section.select('li')[:5]:
-                link = item.select_one('a')
-                if link:
-                    text = link.get_text(strip=True)
-                    # Split into theme name and count
-                    match = re.match(r'(.+?)\s*(\d+)\s*films?', text, re.I)
-                    if match:
-                        data['themes'].append({
-                            'name': match.group(1).strip(),
-                            'count': int(match.group(2))
-                        })
-        
-        # === DIRECTORS ===
-        # Find all director links on the page
-        director_links = soup.select(f'a[href*="/with/director/"]')
-        seen_directors = set()
-        
-        for link in director_links:
-            href = link.get('href', '')
-            # Only get links for this user's diary
-            if f'/{username}/' in href and f'/{year}/' in href:
-                name = link.get_text(strip=True)
-                # Skip if it's just a number or too short
-                if name and len(name) > 2 and not name.isdigit() and 'films' not in name.lower():
-                    if name not in seen_directors:
-                        seen_directors.add(name)
-                        data['directors'].append({'name': name})
-                        if len(data['directors']) >= 5:
-                            break
+                if 'first' in milestone_type:
+                    data['milestones']['first'] = {
+                        'title': film_name,
+                        'poster': get_poster_url(film_id, slug),
+                        'date': date
+                    }
+                elif 'last' in milestone_type:
+                    data['milestones']['last'] = {
+                        'title': film_name,
+                        'poster': get_poster_url(film_id, slug),
+                        'date': date
+                    }
+
+def extract_films_grid(section, data):
+    for item in section.select('li, .film-poster')[:20]:
+        poster_div = item.select_one('div[data-film-name]')
+        if poster_div:
+            # film_id and slug let the film index pick these films up
+            data['films_list'].append(poster_film_data(poster_div))
+
+def poster_film_data(poster):
+    film_data = {
+        'title': poster.get('data-film-name', poster.get('data-item-name', '')),
+        'film_id': poster.get('data-film-id', ''),
+        'slug': poster.get('data-film-slug', poster.get('data-item-slug', ''))
+    }
+    film_data['poster'] = get_poster_url(film_data['film_id'], film_data['slug'])
+    return film_data
+
+def parse_year_page(soup, username, year):
+    """Extract stats and sections from a year-in-review page into the year data dict
+    
+    One walk over the tree routes each tag to the handler that wants it. Whole
+    sections (highest rated, genres, themes, milestones, films grid) are
+    located during the walk and extracted from their own subtree afterwards.
+    Time spent per handler is recorded under timings['sections'] (ms).
+    """
+    data = new_year_data(username, year)
+    data['highs_lows'] = {}
+    timings = {}
+    clock = time.perf_counter
+    walk_start = clock()
+    
+    def timed(name, started):
+        timings[name] = timings.get(name, 0) + (clock() - started) * 1000
+    
+    genre_prefix = f'/{username}/diary/for/{year}/genre/'
+    country_prefix = f'/{username}/diary/for/{year}/country/'
+    user_part, year_part = f'/{username}/', f'/{year}/'
+    
+    # First matching container of each section, in document order
+    sections = {}
+    milestone_candidates = []
+    genre_fallback_links = []
+    seen_countries, seen_directors, seen_actors = set(), set(), set()
+    profile_stat_items = set()
+    display_name_found = avatar_found = False
+    avatar_stack = []  # open a.avatar / .profile-avatar ancestors
+    
+    # Highs and lows: the last labelled item inside the latest container wins
+    container_stack = []  # (index, tag) of open section/div ancestors
+    open_items = []  # [tag, container index, item index, poster]
+    best_highs_lows = {}
+    
+    for index, (tag, entering) in enumerate(walk_tags(soup)):
+        name = tag.name
         
-        # === ACTORS ===
-        # Find all actor links on the page
-        actor_links = soup.select(f'a[href*="/with/actor/"]')
-        seen_actors = set()
-        
-        for link in actor_links:
-            href = link.get('href', '')
-            # Only get links for this user's diary
-            if f'/{username}/' in href and f'/{year}/' in href:
-                name = link.get_text(strip=True)
-                # Skip if it's just a number or too short
-                if name and len(name) > 2 and not name.isdigit() and 'films' not in name.lower():
-                    if name not in seen_actors:
-                        seen_actors.add(name)
-                        data['actors'].append({'name': name})
-                        if len(data['actors']) >= 8:
+        if not entering:
+            if open_items and open_items[-1][0] is tag:
+                item, container_index, item_index, poster = open_items.pop()
+                if poster is not None:
+                    started = clock()
+                    text = item.get_text(strip=True).lower()
+                    for label, key in HIGHS_LOWS_LABELS:
+                        if label in text:
+                            rank = (container_index, item_index)
+                            if key not in best_highs_lows or rank > best_highs_lows[key][0]:
+                                best_highs_lows[key] = (rank, poster)
                             break
+                    timed('highs_lows', started)
+            if container_stack and container_stack[-1][1] is tag:
+                container_stack.pop()
+            if avatar_stack and avatar_stack[-1] is tag:
+                avatar_stack.pop()
+            continue
         
-        # === MILESTONES ===
-        milestones_section = soup.select_one('.yir-milestones, section:has(h3:contains("Milestones"))')
-        if milestones_section:
-            for item in milestones_section.select('.yir-milestone, li'):
-                title_elem = item.select_one('.title, h4')
-                poster_elem = item.select_one('div[data-film-name]')
-                date_elem = item.select_one('.date, time')
-                
-                if title_elem:
-                    milestone_type = title_elem.get_text(strip=True).lower()
-                    if poster_elem:
-                        film_name = poster_elem.get('data-film-name', '')
-                        film_id = poster_elem.get('data-film-id', '')
-                        slug = poster_elem.get('data-film-slug', '')
-                        date = date_elem.get_text(strip=True) if date_elem else ''
-                        
-                        if 'first' in milestone_type:
-                            data['milestones']['first'] = {
-                                'title': film_name,
-                                'poster': get_poster_url(film_id, slug),
-                                'date': date
-                            }
-                        elif 'last' in milestone_type:
-                            data['milestones']['last'] = {
-                                'title': film_name,
-                                'poster': get_poster_url(film_id, slug),
-                                'date': date
-                            }
+        classes = tag.get('class') or ()
+        
+        # === PROFILE INFO ===
+        if not display_name_found and 'displayname' in classes:
+            display_name_found = True
+            data['display_name'] = tag.get_text(strip=True)
+        if (name == 'a' and 'avatar' in classes) or 'profile-avatar' in classes:
+            avatar_stack.append(tag)
+        elif name == 'img' and avatar_stack and not avatar_found:
+            avatar_found = True
+            data['profile_pic'] = tag.get('src', '')
+        
+        # === MAIN STATS ===
+        if 'yir-member-statistic' in classes or 'yir-statistic' in classes \
+                or (name == 'li' and id(tag) in profile_stat_items):
+            started = clock()
+            apply_stat_item(tag, data)
+            timed('stats', started)
+        if 'profile-stats' in classes:
+            profile_stat_items.update(id(li) for li in tag.find_all('li'))
+        
+        # === SECTIONS ===
+        if 'highest' not in sections and ('yir-highest-rated' in classes or
+                                          (name == 'section' and tag.get('data-section') == 'highest-rated')):
+            sections['highest'] = tag
+        if 'genres' not in sections and ('yir-genres' in classes or 'film-breakdown-graph' in classes):
+            sections['genres'] = tag
+        if 'themes' not in sections and ('yir-themes' in classes or
+                                         (name == 'section' and tag.get('data-section') == 'themes')):
+            sections['themes'] = tag
+        if 'films' not in sections and ('poster-list' in classes or 'yir-films-grid' in classes):
+            sections['films'] = tag
+        if 'yir-milestones' in classes:
+            milestone_candidates.append((index, tag))
+        elif name == 'h3' and 'Milestones' in tag.get_text():
+            outer = next(((i, t) for i, t in container_stack if t.name == 'section'), None)
+            if outer:
+                milestone_candidates.append(outer)
+        
+        # === LINKS: genres fallback, countries, directors, actors ===
+        if name == 'a':
+            href = tag.get('href', '')
+            if genre_prefix in href:
+                genre_fallback_links.append(tag)
+            elif country_prefix in href:
+                started = clock()
+                if tag.parent:
+                    country, count = link_with_count(tag)
+                    if country and len(country) < 30 and country not in seen_countries:
+                        seen_countries.add(country)
+                        data['countries'].append({'name': country, 'count': count})
+                timed('countries', started)
+            elif '/with/director/' in href or '/with/actor/' in href:
+                started = clock()
+                # Only get links for this user's diary
+                if user_part in href and year_part in href:
+                    is_director = '/with/director/' in href
+                    people = data['directors'] if is_director else data['actors']
+                    seen = seen_directors if is_director else seen_actors
+                    if len(people) < (5 if is_director else 8):
+                        person = tag.get_text(strip=True)
+                        # Skip if it's just a number or too short
+                        if person and len(person) > 2 and not person.isdigit() and 'films' not in person.lower():
+                            if person not in seen:
+                                seen.add(person)
+                                people.append({'name': person})
+                timed('directors' if '/with/director/' in href else 'actors', started)
         
         # === HIGHS AND LOWS ===
-        data['highs_lows'] = {}
-        
-        # Look for the highs and lows section items
-        for section in soup.select('section, div'):
-            # Find items with labels like "Most Popular", "Most Obscure", etc.
-            items = section.select('li, .stat-item, div.film-stat')
-            for item in items:
-                text = item.get_text(strip=True).lower()
-                poster = item.select_one('div[data-film-name], div[data-item-name]')
-                
-                if poster:
-                    film_data = {
-                        'title': poster.get('data-film-name', poster.get('data-item-name', '')),
-                        'film_id': poster.get('data-film-id', ''),
-                        'slug': poster.get('data-film-slug', poster.get('data-item-slug', ''))
-                    }
-                    film_data['poster'] = get_poster_url(film_data['film_id'], film_data['slug'])
-                    
-                    if 'most popular' in text:
-                        data['highs_lows']['most_popular'] = film_data
-                    elif 'most obscure' in text:
-                        data['highs_lows']['most_obscure'] = film_data
-                    elif 'longest' in text:
-                        data['highs_lows']['longest'] = film_data
-                    elif 'shortest' in text:
-                        data['highs_lows']['shortest'] = film_data
-                    elif 'newest' in text:
-                        data['highs_lows']['newest'] = film_data
-                    elif 'oldest' in text:
-                        data['highs_lows']['oldest'] = film_data
-        
-        # === FILMS LIST (all watched) ===
-        films_grid = soup.select_one('.poster-list, .yir-films-grid')
-        if films_grid:
-            for item in films_grid.select('li, .film-poster')[:20]:
-                poster_div = item.select_one('div[data-film-name]')
-                if poster_div:
-                    data['films_list'].append({
-                        'title': poster_div.get('data-film-name', ''),
-                        'poster': get_poster_url(
-                            poster_div.get('data-film-id', ''),
-                            poster_div.get('data-film-slug', '')
-                        )
-                    })
+        if name == 'div' and open_items and (tag.has_attr('data-film-name') or tag.has_attr('data-item-name')):
+            film_data = None
+            for open_item in open_items:
+                if open_item[3] is None:
+                    film_data = film_data or poster_film_data(tag)
+                    open_item[3] = film_data
+        if container_stack and (name == 'li' or 'stat-item' in classes or (name == 'div' and 'film-stat' in classes)):
+            open_items.append([tag, container_stack[-1][0], index, None])
+        if name == 'section' or name == 'div':
+            container_stack.append((index, tag))
+    
+    timed('walk', walk_start)
+    
+    for key, (_, film_data) in best_highs_lows.items():
+        data['highs_lows'][key] = film_data
+    
+    # === SECTION HANDLERS ===
+    started = clock()
+    if 'highest' in sections:
+        extract_highest_rated(sections['highest'], data)
+    timed('highest_rated', started)
+    
+    started = clock()
+    seen_genres = set()
+    if 'genres' in sections:
+        extract_genre_breakdown(sections['genres'], data, seen_genres)
+    # Fallback: Extract from href patterns
+    if not data['genres']:
+        for link in genre_fallback_links:
+            if link.parent:
+                genre, count = link_with_count(link)
+                if genre and len(genre) < 30 and genre not in seen_genres:
+                    seen_genres.add(genre)
+                    data['genres'].append({'name': genre, 'count': count})
+    timed('genres', started)
+    
+    started = clock()
+    if 'themes' in sections:
+        extract_themes(sections['themes'], data)
+    timed('themes', started)
+    
+    started = clock()
+    if milestone_candidates:
+        extract_milestones(min(milestone_candidates, key=lambda c: c[0])[1], data)
+    timed('milestones', started)
+    
+    started = clock()
+    if 'films' in sections:
+        extract_films_grid(sections['films'], data)
+    timed('films_list', started)
+    
+    data['timings']['sections'] = {name: round(ms, 2) for name, ms in timings.items()}
+    return data
+
+def wait_for_year_page(driver, timeout=SELENIUM_READY_TIMEOUT, cancel=None):
+    """Wait until the year page sections have rendered. Returns (state, seconds waited)
+    
+    state is 'ready' (every section present), 'settled' (stats present, optional
+    sections never appeared), 'missing' (404 or private profile), 'cancelled'
+    or 'timeout'.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    
+    start = time.time()
+    settled_since = [None]
+    
+    def check(d):
+        if is_cancelled(cancel):
+            return 'cancelled'
+        state = d.execute_script(YEAR_PAGE_STATE_SCRIPT, YEAR_PAGE_READY_SELECTORS)
+        if state.get('missing'):
+            return 'missing'
+        found = state.get('found', [])
+        if found and all(found):
+            return 'ready'
+        # Not every year has highest-rated films or genres - once the stats are
+        # in and loading is done, give the rest a short grace period
+        if found and found[0] and state.get('complete'):
+            if settled_since[0] is None:
+                settled_since[0] = time.time()
+            elif time.time() - settled_since[0] >= SELENIUM_SETTLE_GRACE:
+                return 'settled'
+        return False
+    
+    try:
+        state = WebDriverWait(driver, timeout, poll_frequency=0.1).until(check)
+    except TimeoutException:
+        state = 'timeout'
+    return state, round(time.time() - start, 3)
+
+def scrape_with_selenium(username, year, cancel=None):
+    """Use Selenium to scrape the fully-rendered year page"""
+    url = f"{LETTERBOXD_URL}/{username}/year/{year}/"
+    
+    if is_cancelled(cancel):
+        return None
+    
+    try:
+        # A cancelled build stops waiting for a browser instead of holding its stage worker
+        with driver_pool.checkout(cancel=cancel) as driver:
+            if is_cancelled(cancel):
+                return None
+            outbound_limiter.acquire(SELENIUM_NAVIGATION_COST)
+            with stage_seconds.time(stage='selenium_navigation'):
+                driver.get(url)
+            
+            # Wait for the sections the parser needs instead of a fixed sleep
+            state, waited = wait_for_year_page(driver, cancel=cancel)
+            stage_seconds.observe(waited, stage='selenium_ready_wait')
+            print(f"Year page {state} after {waited}s: {url}")
+            if state in ('missing', 'cancelled'):
+                return None
+            
+            # What the page cost to load under this profile
+            weight = page_weight(driver)
+            
+            # Get page source after JS rendering
+            page_source = driver.page_source
         
+        with stage_seconds.time(stage='year_page_parse'):
+            data = parse_year_page(make_soup(page_source, 'year'), username, year)
+        check_parser_parity(data, page_source, parse_year_page, username, year)
+        data['timings']['ready_wait'] = waited
+        data['timings']['ready_state'] = state
+        if weight:
+            selenium_page_bytes.observe(weight['bytes'], profile=CHROME_PROFILE)
+            stage_seconds.observe(weight['load'] or weight['dom_content_loaded'], stage='selenium_page_load')
+            data['timings'].update({
+                'page_bytes': weight['bytes'],
+                'page_resources': weight['resources'],
+                'page_load': round(weight['load'] or weight['dom_content_loaded'], 3),
+            })
         return data
         
+    except DriverCheckoutCancelled:
+        return None
     except Exception as e:
         print(f"Selenium scraping error: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def scrape_profile_basic(username):
-    """Quick scrape of profile for basic info (no Selenium needed)"""
-    url = f"https://letterboxd.com/{username}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+def inline_year_page_fragments(soup, cancel=None):
+    """Fetch the lazily-loaded fragments of a year page and splice them into the soup"""
+    placeholders = [
+        el for el in soup.select('[data-src], [data-url]')
+        if (el.get('data-src') or el.get('data-url') or '').startswith(('/csi/', '/ajax/'))
+    ]
+    if not placeholders:
+        return soup
+    
+    def fetch(path):
+        if is_cancelled(cancel):
+            return None
+        response = http_client.get(f"{LETTERBOXD_URL}{path}", timeout=10)
+        return response.text if response.status_code == 200 else None
+    
+    paths = [el.get('data-src') or el.get('data-url') for el in placeholders]
+    futures = [submit_with_context(fragment_executor, fetch, path) for path in paths]
+    fragments = [future.result() for future in futures]
+    
+    for el, fragment in zip(placeholders, fragments):
+        if fragment:
+            parsed = make_soup(fragment)
+            el.clear()
+            el.extend(list((parsed.body or parsed).contents))
+    return soup
+
+def scrape_year_page_http(username, year, cancel=None):
+    """Browser-free year page scrape: server HTML plus its lazily-loaded fragments"""
+    url = f"{LETTERBOXD_URL}/{username}/year/{year}/"
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
+        response = http_client.get(url, timeout=15)
+        if response.status_code != 200 or is_cancelled(cancel):
             return None
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with stage_seconds.time(stage='year_page_parse'):
+            soup = make_soup(response.text, 'year')
+        with stage_seconds.time(stage='year_page_fragments'):
+            inline_year_page_fragments(soup, cancel)
+        if is_cancelled(cancel):
+            return None
+        with stage_seconds.time(stage='year_page_parse'):
+            data = parse_year_page(soup, username, year)
+        check_parser_parity(data, str(soup), parse_year_page, username, year)
+        return data
         
-        data = {
-            'display_name': username,
-            'profile_pic': '',
-            'total_films': 0,
-            'rating_distribution': {},
-            'average_rating': 0
+    except Exception as e:
+        print(f"HTTP year page error: {e}")
+        return None
+
+def film_page_url(slug):
+    return f"{LETTERBOXD_URL}/film/{slug}/"
+
+def parse_film_page(soup):
+    """Release year, runtime (minutes), genres and directors from a film page"""
+    data = {'release_year': None, 'runtime': None, 'genres': [], 'directors': []}
+    
+    # The JSON-LD block has the year, genres and directors; it is wrapped in CDATA comments
+    script = soup.find('script', type='application/ld+json')
+    if script and script.string:
+        try:
+            movie = json.loads(re.sub(r'/\*.*?\*/', '', script.string, flags=re.S))
+        except ValueError:
+            movie = {}
+        genres = movie.get('genre') or []
+        data['genres'] = [genres] if isinstance(genres, str) else [g for g in genres if isinstance(g, str)]
+        data['directors'] = [d['name'] for d in movie.get('director') or [] if isinstance(d, dict) and d.get('name')]
+        for event in movie.get('releasedEvent') or []:
+            match = re.match(r'\d{4}', str(event.get('startDate', '')))
+            if match:
+                data['release_year'] = int(match.group())
+                break
+    
+    # Markup fallbacks
+    if not data['genres']:
+        for link in soup.select('#tab-genres a[href*="/films/genre/"]'):
+            name = link.get_text(strip=True)
+            if name and name not in data['genres']:
+                data['genres'].append(name)
+    if not data['directors']:
+        for link in soup.select('a[href^="/director/"]'):
+            name = link.get_text(strip=True)
+            if name and name not in data['directors']:
+                data['directors'].append(name)
+    if data['release_year'] is None:
+        link = soup.select_one('a[href*="/films/year/"]')
+        match = re.search(r'\d{4}', link.get_text()) if link else None
+        if match:
+            data['release_year'] = int(match.group())
+    
+    # "114 mins   More at IMDb TMDb"
+    footer = soup.select_one('p.text-footer')
+    match = re.search(r'(\d+)\s*mins?', footer.get_text(' ', strip=True)) if footer else None
+    if match:
+        data['runtime'] = int(match.group(1))
+    return data
+
+def scrape_film_details(slug):
+    """A film page's metadata for the film index, or None when the page didn't load"""
+    status, data = http_client.get_parsed(
+        film_page_url(slug), lambda html: parse_film_page(make_soup(html, 'film')),
+        key='film', timeout=10, remember=False)
+    return data if status == 200 else None
+
+# Film metadata shared by every user, filled from film pages in the background
+film_index = FilmIndex(scrape_film_details, get_poster_url)
+# Skip the Selenium fallback when the index has details for this share of the user's stored diary
+FILM_INDEX_MIN_COVERAGE = float(os.environ.get('FILM_INDEX_MIN_COVERAGE', '0.9'))
+
+def film_index_covers(username, year):
+    """True when the year page's render-only sections can be worked out from the film index instead"""
+    return DIARY_SYNC and film_index.coverage(diary_store.films(username, year)) >= FILM_INDEX_MIN_COVERAGE
+
+def is_year_data_complete(data):
+    """The stats block and genre breakdown are the parts only a full render is sure to have"""
+    return bool(data and data.get('films_logged') and data.get('genres'))
+
+def scrape_year_page(username, year, cancel=None):
+    """Scrape the year page with the configured engine"""
+    if YEAR_PAGE_ENGINE == 'selenium':
+        return scrape_with_selenium(username, year, cancel)
+    
+    data = scrape_year_page_http(username, year, cancel)
+    if YEAR_PAGE_ENGINE == 'http' or is_year_data_complete(data) or is_cancelled(cancel):
+        return data
+    
+    # The stats are there; genres, hours and directors can come from rated films plus the film index
+    if data and data.get('films_logged') and film_index_covers(username, year):
+        print(f"HTTP year page incomplete for {username}/{year}, filling it in from the film index")
+        return data
+    
+    print(f"HTTP year page incomplete for {username}/{year}, falling back to Selenium")
+    return scrape_with_selenium(username, year, cancel) or data
+
+def parse_profile_page(soup, username):
+    """Extract display name, avatar, film count and rating histogram from a profile page"""
+    data = {
+        'display_name': username,
+        'profile_pic': '',
+        'total_films': 0,
+        'rating_distribution': {},
+        'average_rating': 0
+    }
+    
+    # Display name
+    name = soup.select_one('span.displayname')
+    if name:
+        data['display_name'] = name.get_text(strip=True)
+    
+    # Avatar
+    avatar = soup.select_one(f'img[alt="{data["display_name"]}"]')
+    if avatar:
+        data['profile_pic'] = avatar.get('src', '')
+    
+    # Total films
+    for stat in soup.select('h4.profile-statistic'):
+        value = stat.select_one('span.value')
+        label = stat.select_one('span.definition')
+        if value and label:
+            v = value.get_text(strip=True).replace(',', '')
+            l = label.get_text(strip=True).lower()
+            if 'film' in l and 'this year' not in l:
+                data['total_films'] = int(v) if v.isdigit() else 0
+    
+    # Rating distribution
+    rating_section = soup.select_one('section.ratings-histogram-chart')
+    if rating_section:
+        rating_map = {
+            '½': 0.5, '★': 1, '★½': 1.5, '★★': 2, '★★½': 2.5,
+            '★★★': 3, '★★★½': 3.5, '★★★★': 4, '★★★★½': 4.5, '★★★★★': 5
         }
         
-        # Display name
-        name = soup.select_one('span.displayname')
-        if name:
-            data['display_name'] = name.get_text(strip=True)
-        
-        # Avatar
-        avatar = soup.select_one(f'img[alt="{data["display_name"]}"]')
-        if avatar:
-            data['profile_pic'] = avatar.get('src', '')
-        
-        # Total films
-        for stat in soup.select('h4.profile-statistic'):
-            value = stat.select_one('span.value')
-            label = stat.select_one('span.definition')
-            if value and label:
-                v = value.get_text(strip=True).replace(',', '')
-                l = label.get_text(strip=True).lower()
-                if 'film' in l and 'this year' not in l:
-                    data['total_films'] = int(v) if v.isdigit() else 0
-        
-        # Rating distribution
-        rating_section = soup.select_one('section.ratings-histogram-chart')
-        if rating_section:
-            rating_map = {
-                '½': 0.5, '★': 1, '★½': 1.5, '★★': 2, '★★½': 2.5,
-                '★★★': 3, '★★★½': 3.5, '★★★★': 4, '★★★★½': 4.5, '★★★★★': 5
-            }
-            
-            total_weighted = 0
-            total_count = 0
-            
-            for link in rating_section.select('a.bar[data-original-title]'):
-                title = link.get('data-original-title', '')
-                match = re.match(r'(\d+)\s+([\u2605\u00bd]+)\s+ratings?', title)
-                if match:
-                    count = int(match.group(1))
-                    stars = match.group(2)
-                    rating_val = rating_map.get(stars, 0)
-                    
-                    if rating_val > 0:
-                        data['rating_distribution'][str(rating_val)] = count
-                        total_weighted += count * rating_val
-                        total_count += count
-            
-            if total_count > 0:
-                data['average_rating'] = round(total_weighted / total_count, 2)
-                data['total_ratings'] = total_count
+        total_weighted = 0
+        total_count = 0
         
+        for link in rating_section.select('a.bar[data-original-title]'):
+            title = link.get('data-original-title', '')
+            match = re.match(r'(\d+)\s+([\u2605\u00bd]+)\s+ratings?', title)
+            if match:
+                count = int(match.group(1))
+                stars = match.group(2)
+                rating_val = rating_map.get(stars, 0)
+                
+                if rating_val > 0:
+                    data['rating_distribution'][str(rating_val)] = count
+                    total_weighted += count * rating_val
+                    total_count += count
+        
+        if total_count > 0:
+            data['average_rating'] = round(total_weighted / total_count, 2)
+            data['total_ratings'] = total_count
+    
+    return data
+
+def scrape_profile_basic(username):
+    """Quick scrape of profile for basic info (no Selenium needed)"""
+    url = f"{LETTERBOXD_URL}/{username}"
+    
+    def parse(html):
+        data = parse_profile_page(make_soup(html, 'profile'), username)
+        check_parser_parity(data, html, parse_profile_page, username)
+        return data
+    
+    try:
+        status, data = http_client.get_parsed(url, parse, key='profile', timeout=10)
+        if status != 200:
+            return None
         return data
         
     except Exception as e:
@@ -580,33 +1223,104 @@ def get_movie_era(genres):
 def index():
     return render_template('index.html')
 
-@app.route('/api/wrapped/<username>/<int:year>')
-def get_wrapped(username, year):
-    """Main API endpoint"""
+def timed_stage(timings, name, fn, *args):
+    """Run one pipeline stage, recording its wall time in seconds"""
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[name] = round(elapsed, 3)
+        stage_seconds.observe(elapsed, stage=name)
+
+def build_wrapped(username, year, publish=None):
+    """Run the full scrape for a user/year. Returns (result, error)
     
-    # Get profile basics first (fast)
-    profile = scrape_profile_basic(username)
-    if not profile:
-        return jsonify({'error': f'User "{username}" not found'})
+    The profile, year page and reviews stages start together on the shared
+    stage executor; only the merge waits for the profile. A missing profile
+    or year page cancels the stages still running.
     
-    # Run Selenium scrape and reviews scrape IN PARALLEL for speed
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        selenium_future = executor.submit(scrape_with_selenium, username, year)
-        reviews_future = executor.submit(scrape_all_rated_films, username, year)
-        
-        year_data = selenium_future.result()
-        all_rated_films = reviews_future.result()
+    publish(name, section), when given, receives the profile, ratings and year
+    sections as each one lands, so callers can render before the merge.
+    """
+    publish = publish or (lambda name, section: None)
+    cancel = threading.Event()
+    stages = {}
+    start = time.perf_counter()
     
-    if not year_data:
-        return jsonify({'error': f'Could not load data for {year}'})
+    profile_future = submit_with_context(
+        stage_executor, timed_stage, stages, 'profile', scrape_profile_basic, username)
+    year_future = submit_with_context(
+        stage_executor, timed_stage, stages, 'year_page', scrape_year_page, username, year, cancel)
+    reviews_future = submit_with_context(
+        stage_executor, timed_stage, stages, 'reviews',
+        sync_rated_films if DIARY_SYNC else scrape_all_rated_films, username, year, cancel)
+    
+    profile = None
+    held = []  # sections that finished before the profile, published once it checks out
+    try:
+        for future in concurrent.futures.as_completed([profile_future, year_future, reviews_future]):
+            if future is profile_future:
+                profile = future.result()
+                if not profile:
+                    return None, f'User "{username}" not found'
+                publish('profile', profile_section(username, year, profile))
+                for section in held:
+                    publish(*section)
+                continue
+            
+            if future is year_future:
+                if not future.result():
+                    # The reviews are no use without the year page; report the profile's verdict if it has one
+                    cancel.set()
+                    if not profile_future.result():
+                        return None, f'User "{username}" not found'
+                    return None, f'Could not load data for {year}'
+                film_index.note(future.result().get('films_list', []))
+                section = ('year', year_section(future.result()))
+            else:
+                film_index.note(future.result())
+                ratings = rating_section(future.result())
+                if not ratings:
+                    continue
+                ratings['personality'] = get_personality(
+                    ratings['average_rating'], ratings['five_star_pct'], ratings['total_ratings'])
+                section = ('ratings', ratings)
+            
+            if profile:
+                publish(*section)
+            else:
+                held.append(section)
+    finally:
+        # Whatever ended the loop, stop any stage still running
+        cancel.set()
     
-    # Merge data
-    result = {
+    result = timed_stage(stages, 'aggregate', aggregate_wrapped,
+                         username, year, profile, year_future.result(), reviews_future.result())
+    total = round(time.perf_counter() - start, 3)
+    stage_seconds.observe(total, stage='total')
+    fetches = {name: stages[name] for name in ('profile', 'year_page', 'reviews')}
+    result['timings'] = dict(result['timings'], stages=dict(stages), total=total,
+                             critical_path=max(fetches, key=fetches.get))
+    print(f"Wrapped {username}/{year} in {total}s "
+          + ', '.join(f"{name} {seconds}s" for name, seconds in stages.items()))
+    return result, None
+
+def profile_section(username, year, profile):
+    """The profile-page part of a wrapped result"""
+    return {
         'username': username,
-        'display_name': year_data.get('display_name') or profile['display_name'],
-        'profile_pic': year_data.get('profile_pic') or profile['profile_pic'],
+        'display_name': profile['display_name'],
+        'profile_pic': profile['profile_pic'],
         'year': year,
-        
+        'rating_distribution': profile.get('rating_distribution', {}),
+        'average_rating': profile.get('average_rating', 0),
+        'total_ratings': profile.get('total_ratings', 0),
+    }
+
+def year_section(year_data):
+    """The year-page part of a wrapped result"""
+    section = {
         # Core stats
         'films_logged': year_data.get('films_logged', 0),
         'hours_watched': year_data.get('hours_watched', 0),
@@ -628,55 +1342,653 @@ def get_wrapped(username, year):
         'highs_lows': year_data.get('highs_lows', {}),
         'films_list': year_data.get('films_list', [])[:16],
         
-        # Profile stats (will be overwritten if we calculate from films)
-        'rating_distribution': profile.get('rating_distribution', {}),
-        'average_rating': profile.get('average_rating', 0),
-        'total_ratings': profile.get('total_ratings', 0),
+        # Where the time went, for tuning
+        'timings': year_data.get('timings', {}),
+    }
+    section['movie_era'] = get_movie_era(section['genres'])
+    if year_data.get('display_name'):
+        section['display_name'] = year_data['display_name']
+    if year_data.get('profile_pic'):
+        section['profile_pic'] = year_data['profile_pic']
+    return section
+
+def fill_from_film_index(result, rated_films):
+    """Genres, directors and hours the year page didn't have, derived from the rated films' film pages
+    
+    Only rated entries count, so these can run lower than the year page's
+    own numbers. What was filled in, and the share of entries the index
+    has details for, go under film_index.
+    """
+    derived = film_index.derive(rated_films)
+    if not derived:
+        return
+    filled = []
+    if not result['genres'] and derived['genres']:
+        result['genres'] = derived['genres']
+        result['movie_era'] = get_movie_era(result['genres'])
+        filled.append('genres')
+    if not result['directors'] and derived['directors']:
+        result['directors'] = derived['directors'][:5]
+        filled.append('directors')
+    if not result['hours_watched'] and derived['hours_watched']:
+        result['hours_watched'] = derived['hours_watched']
+        result['minutes_watched'] = int(derived['hours_watched'] * 60)
+        result['days_equivalent'] = round(derived['hours_watched'] / 24, 1)
+        filled.append('hours_watched')
+    if filled:
+        result['film_index'] = {'filled': filled, 'coverage': derived['coverage']}
+
+def rating_section(rated_films):
+    """Average, star distribution, percentiles, monthly counts and highest/lowest from a list of rated films"""
+    stats = FilmColumns(rated_films).rating_stats()
+    if stats is None:
+        return {}
+    return {
+        'average_rating': round(stats['mean'], 2),
+        'total_ratings': stats['total'],
+        'star_distribution': stats['star_distribution'],
+        'five_star_pct': stats['five_star_pct'],
+        'rating_percentiles': stats['percentiles'],
+        'films_by_month': stats['monthly_counts'],
+        'highest_rated_film': stats['highest'],
+        'lowest_rated_film': stats['lowest'],
+    }
+
+def aggregate_wrapped(username, year, profile, year_data, all_rated_films):
+    """Merge profile, year page and rated films into the wrapped result"""
+    result = profile_section(username, year, profile)
+    result.update({
+        # Overwritten below if we have rated films to calculate from
         'star_distribution': {},
         'highest_rated_film': None,
         'lowest_rated_film': None,
-    }
+        'five_star_pct': 0,
+        'rating_percentiles': {},
+        'films_by_month': None,
+    })
+    result.update(year_section(year_data))
+    if all_rated_films and not (result['genres'] and result['directors'] and result['hours_watched']):
+        fill_from_film_index(result, all_rated_films)
     
-    # Calculate rating stats from ALL rated films (already fetched in parallel above)
-    result['five_star_pct'] = 0  # Default value
+    # Calculate rating stats from ALL rated films, or the rated top films as a fallback
     rated_films = all_rated_films if all_rated_films else [f for f in result['top_films'] if f.get('rating')]
+    result.update(rating_section(rated_films))
     
-    if rated_films:
-        # Calculate average
-        avg = sum(f['rating'] for f in rated_films) / len(rated_films)
-        result['average_rating'] = round(avg, 2)
-        result['total_ratings'] = len(rated_films)
-        
-        # Build rating distribution (count per star level)
-        star_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for f in rated_films:
-            r = f.get('rating', 0)
-            # Round to nearest whole star for distribution
-            star = min(5, max(1, round(r)))
-            star_counts[star] += 1
-        
-        result['star_distribution'] = star_counts
-        result['five_star_pct'] = (star_counts[5] / len(rated_films)) * 100 if rated_films else 0
-        
-        # Find highest and lowest rated films (with posters)
-        sorted_by_rating = sorted(rated_films, key=lambda x: x.get('rating', 0), reverse=True)
-        if sorted_by_rating:
-            result['highest_rated_film'] = sorted_by_rating[0]
-            # Get lowest that's different from highest
-            for film in reversed(sorted_by_rating):
-                if film.get('title') != sorted_by_rating[0].get('title'):
-                    result['lowest_rated_film'] = film
-                    break
-    
-    # Generate personality and era
+    # Generate personality
     result['personality'] = get_personality(result['average_rating'], result['five_star_pct'], result['total_ratings'])
-    result['movie_era'] = get_movie_era(result['genres'])
     
-    return jsonify(result)
+    # Every rated film, trimmed to what cross-user comparisons need
+    result['rated_films'] = [
+        {'film_id': f.get('film_id', ''), 'slug': f.get('slug', ''), 'title': f['title'], 'rating': f['rating']}
+        for f in all_rated_films
+    ]
+    
+    return result
+
+def result_posters(result):
+    """(poster url, width) for every poster the slides show, at the width index.html asks for"""
+    top = result.get('top_films', [])[:4]
+    posters = [(f.get('poster'), 500 if i == 0 else 300) for i, f in enumerate(top)]
+    posters += [(f.get('poster'), 150) for f in top]  # share card
+    for film in (result.get('highest_rated_film'), result.get('lowest_rated_film')):
+        if film:
+            posters.append((film.get('poster'), 150))
+    obscure = result.get('highs_lows', {}).get('most_obscure')
+    if obscure:
+        posters.append((obscure.get('poster'), 300))
+    return posters
+
+def compute_wrapped(username, year, publish=None):
+    """Build a wrapped result and cache it on success. Runs on the job executor"""
+    result, error = build_wrapped(username, year, publish)
+    if not error:
+        result_cache.set(username, year, result)
+        year_summaries.put(username, year, summarize_year(result))
+        poster_cache.prewarm(result_posters(result))
+    return result, error
+
+# Wrapped generation runs here; identical concurrent requests share one job
+jobs = JobManager(compute_wrapped)
+
+# Stale results are served at once and refreshed here, at background priority
+refresher = RefreshScheduler(lambda username, year: jobs.submit(username, year, BACKGROUND))
+
+# Seconds between keepalive comments on an idle event stream
+SSE_KEEPALIVE = float(os.environ.get('SSE_KEEPALIVE', '15'))
+
+def public_result(result):
+    """A wrapped result as the API returns it; rated_films is only kept for compare"""
+    return {k: v for k, v in result.items() if k != 'rated_films'}
+
+def wants_refresh():
+    return request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+def bypass_cache(username, year):
+    """?refresh=1: skip the cached result, and walk the whole diary so edits and deletions show up"""
+    result_cache.note_bypass()
+    diary_store.expire(username, year)
+
+def cached_wrapped(username, year):
+    """(result, tier, age) from the result cache, stale entries included
+    
+    Counts the request towards the key's refresh priority, and queues a
+    background refresh when the entry is stale (or popular and about to
+    expire). A stale result is marked with stale and its age in seconds.
+    """
+    cached, tier, age = result_cache.lookup(username, year)
+    refresher.observe(username, year, age, result_cache.ttl_for(year))
+    if tier == 'stale':
+        cached = dict(cached, stale=True, age=int(age))
+    return cached, tier, age
+
+def server_timing(entries):
+    """Server-Timing header value from (name, seconds, description) entries"""
+    parts = []
+    for name, seconds, desc in entries:
+        part = name
+        if desc:
+            part += f';desc="{desc}"'
+        parts.append(f'{part};dur={seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+@app.route('/api/wrapped/<username>/<int:year>')
+def get_wrapped(username, year):
+    """Main API endpoint. Pass ?refresh=1 to bypass the cache for this request"""
+    started = time.perf_counter()
+    
+    if wants_refresh():
+        bypass_cache(username, year)
+        cache_status = 'BYPASS'
+    else:
+        cached, tier, age = cached_wrapped(username, year)
+        if cached is not None:
+            response = jsonify(public_result(cached))
+            response.headers['X-Cache'] = 'STALE' if tier == 'stale' else f'HIT-{tier.upper()}'
+            response.headers['Age'] = str(int(age))
+            response.headers['Server-Timing'] = server_timing(
+                [('cache', time.perf_counter() - started, f'HIT-{tier.upper()}')])
+            return response
+        cache_status = 'MISS'
+    
+    # Join an in-flight scrape for the same user/year rather than starting another
+    job, created = jobs.submit(username, year)
+    job.wait()
+    if job.error:
+        return jsonify({'error': job.error})
+    
+    response = jsonify(public_result(job.result))
+    response.headers['X-Cache'] = cache_status if created else 'JOINED'
+    
+    # Where the time went, for the browser's devtools
+    timings = job.result.get('timings', {})
+    entries = [(name, seconds, None) for name, seconds in timings.get('stages', {}).items()]
+    entries.append(('total', time.perf_counter() - started, response.headers['X-Cache']))
+    response.headers['Server-Timing'] = server_timing(entries)
+    return response
+
+def sse_event(name, payload):
+    return f'event: {name}\ndata: {json.dumps(payload)}\n\n'
+
+@app.route('/api/wrapped/<username>/<int:year>/stream')
+def stream_wrapped(username, year):
+    """Server-sent events: profile, ratings and year sections as they land, then done (or error)
+    
+    The response holds a web thread until the job finishes, so the page
+    polls /api/jobs/<job_id>?since= instead; this is for API clients.
+    """
+    cached = None
+    if wants_refresh():
+        bypass_cache(username, year)
+    else:
+        cached, _, _ = cached_wrapped(username, year)
+    
+    def events():
+        if cached is not None:
+            yield sse_event('done', public_result(cached))
+            return
+        
+        # Joining an in-flight job replays the sections it has already published
+        job, _ = jobs.submit(username, year)
+        for section in job.follow(idle=SSE_KEEPALIVE):
+            if section is None:
+                yield ': keepalive\n\n'
+            else:
+                yield sse_event(*section)
+        
+        if job.error:
+            yield sse_event('error', {'error': job.error})
+        else:
+            yield sse_event('done', public_result(job.result))
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let a proxy hold events back
+    return response
+
+# Friend-group comparisons: how many users one request may ask for
+COMPARE_MAX_USERS = int(os.environ.get('COMPARE_MAX_USERS', '8'))
+
+def compare_usernames():
+    """Usernames from a JSON body ({"usernames": [...]}) or ?users=a,b, de-duplicated in order"""
+    body = request.get_json(silent=True) or {}
+    names = body.get('usernames')
+    if not isinstance(names, list):
+        names = request.args.get('users', '').split(',')
+    
+    usernames = []
+    seen = set()
+    for name in names:
+        name = str(name).strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            usernames.append(name)
+    return usernames
+
+def gather_wrapped(requests, priority=BATCH):
+    """Yield (username, year, result, error) for each (username, year) as soon as it is ready
+    
+    Cached results come back first. The rest are submitted to the shared job
+    scheduler together, so they scrape concurrently and join any scrape
+    already in flight for the same user and year. Their letterboxd.com
+    requests queue behind single-user (interactive) ones.
+    """
+    finished = queue.Queue()
+    pending = 0
+    for username, year in requests:
+        cached, _ = result_cache.get(username, year)
+        if cached is not None:
+            yield username, year, cached, None
+            continue
+        job, _ = jobs.submit(username, year, priority)
+        job.on_done(finished.put)
+        pending += 1
+    
+    for _ in range(pending):
+        job = finished.get()
+        yield job.username, job.year, job.result, job.error
+
+def user_summary(username, result, error):
+    """Per-user entry of a compare response (rated_films is summarised by the comparison instead)"""
+    if error:
+        return {'username': username, 'error': error}
+    return {'username': username, 'result': public_result(result)}
+
+@app.route('/api/compare/<int:year>', methods=['GET', 'POST'])
+def compare_wrapped(year):
+    """Wrapped results for several users plus shared films, genre overlap and rating comparisons
+    
+    Pass ?stream=1 for server-sent events: one user event per user as it
+    finishes, then the comparison.
+    """
+    usernames = compare_usernames()
+    if len(usernames) < 2:
+        return jsonify({'error': 'Give at least two usernames to compare'}), 400
+    if len(usernames) > COMPARE_MAX_USERS:
+        return jsonify({'error': f'At most {COMPARE_MAX_USERS} users can be compared at once'}), 400
+    
+    def comparison(results):
+        if len(results) < 2:
+            return {'error': 'Fewer than two users could be loaded'}
+        return compare_results({u: results[u] for u in usernames if u in results})
+    
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        def events():
+            results = {}
+            for username, _, result, error in gather_wrapped([(u, year) for u in usernames]):
+                if not error:
+                    results[username] = result
+                yield sse_event('user', user_summary(username, result, error))
+            yield sse_event('comparison', comparison(results))
+        
+        response = Response(stream_with_context(events()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    results = {}
+    users = {}
+    for username, _, result, error in gather_wrapped([(u, year) for u in usernames]):
+        users[username] = user_summary(username, result, error)
+        if not error:
+            results[username] = result
+    
+    return jsonify({
+        'year': year,
+        'users': [users[u] for u in usernames],
+        'comparison': comparison(results),
+    })
+
+# Longest span the multi-year view will cover in one request
+LIFETIME_MAX_YEARS = int(os.environ.get('LIFETIME_MAX_YEARS', '15'))
+
+@app.route('/api/wrapped/<username>/all')
+def lifetime_wrapped(username):
+    """Multi-year view: lifetime totals, trends and year-over-year changes (?from=2019&to=2024)
+    
+    Finished years come from their stored summaries; only years without one
+    (normally just the current year) are scraped, all at once.
+    """
+    this_year = time.localtime().tm_year
+    last = request.args.get('to', this_year, type=int)
+    first = request.args.get('from', last - 4, type=int)
+    if first > last or last - first + 1 > LIFETIME_MAX_YEARS:
+        return jsonify({'error': f'Pick a range of 1 to {LIFETIME_MAX_YEARS} years'}), 400
+    
+    summaries = {}
+    sources = {}
+    missing = []
+    for year in range(first, last + 1):
+        summary = year_summaries.get(username, year)
+        if summary is not None:
+            summaries[year] = summary
+            sources[year] = 'stored'
+        else:
+            missing.append((username, year))
+    
+    errors = {}
+    for _, year, result, error in gather_wrapped(missing):
+        if error:
+            errors[year] = error
+            continue
+        summaries[year] = summarize_year(result)
+        year_summaries.put(username, year, summaries[year])
+        sources[year] = 'computed'
+    
+    if not summaries:
+        return jsonify({'error': f'No wrapped data for {username} between {first} and {last}', 'errors': errors})
+    
+    return jsonify({
+        'username': username,
+        'from': first,
+        'to': last,
+        'years': [summaries[y] for y in sorted(summaries)],
+        'sources': sources,
+        'errors': errors,
+        **merge_summaries(summaries.values()),
+    })
+
+@app.route('/api/summaries/stats')
+def summary_stats():
+    return jsonify(year_summaries.stats())
+
+@app.route('/api/diary/stats')
+def diary_stats():
+    return jsonify(diary_store.stats())
+
+@app.route('/api/jobs/wrapped/<username>/<int:year>', methods=['POST'])
+def create_wrapped_job(username, year):
+    """Start (or join) a wrapped job and return its id right away"""
+    cached = None
+    if wants_refresh():
+        bypass_cache(username, year)
+    else:
+        cached, _ = result_cache.get(username, year)
+    
+    if cached is not None:
+        job = jobs.completed(username, year, cached)
+    else:
+        job, _ = jobs.submit(username, year)
+    
+    # A cached (or just finished) result comes back at once, so the caller need not poll
+    body = job.to_dict(include_result=job.finished)
+    if 'result' in body:
+        body['result'] = public_result(body['result'])
+    body['status_url'] = f'/api/jobs/{job.id}'
+    return jsonify(body), 200 if job.finished else 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Job status, plus the result once done. ?wait=N long-polls up to N seconds (max 30)
+    
+    With ?since=K the response also carries the sections published after
+    the first K, and a long poll returns as soon as a new one lands, so a
+    page can render progressively without holding a thread for the whole job.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    since = request.args.get('since', type=int)
+    if wait > 0:
+        if since is None:
+            job.wait(wait)
+        else:
+            job.wait_for_sections(since, wait)
+    body = job.to_dict(since=since)
+    if 'result' in body:
+        body['result'] = public_result(body['result'])
+    return jsonify(body)
+
+@app.route('/api/jobs/stats')
+def job_stats():
+    return jsonify(jobs.stats())
+
+@app.route('/api/wrapped/<username>/<int:year>', methods=['DELETE'])
+def purge_wrapped(username, year):
+    """Drop a cached result and the stored diary so the next request re-scrapes in full"""
+    result_cache.purge(username, year)
+    diary_store.purge(username, year)
+    return jsonify({'purged': True, 'username': username, 'year': year})
+
+@app.route('/api/poster')
+def poster():
+    """Poster proxy: ?src=<Letterboxd CDN poster URL>&w=<display width>[&fmt=avif|webp|jpeg]"""
+    src = canonical_poster_url(request.args.get('src', ''))
+    if src is None:
+        return jsonify({'error': 'Not a Letterboxd poster URL'}), 400
+    
+    width = request.args.get('w', POSTER_WIDTHS[-1], type=int)
+    fmt = poster_cache.negotiate(request.headers.get('Accept'), request.args.get('fmt'))
+    digest, content = poster_cache.get(src, width, fmt)
+    if content is None:
+        # Let the browser try the CDN itself
+        return redirect(src)
+    
+    response = Response(content, mimetype=CONTENT_TYPES[fmt])
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = POSTER_MAX_AGE
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response.make_conditional(request)
+
+@app.route('/api/wrapped/<username>/<int:year>/card')
+def share_card(username, year):
+    """The share card as one image (?fmt=png or webp), redrawn only when the data on it changes
+    
+    Until the user's result is cached this starts (or joins) the scrape and
+    returns 202 with the job, rather than holding a web thread for it; poll
+    status_url, then ask again.
+    """
+    if not share_cards.available:
+        return jsonify({'error': 'Share cards need Pillow installed on the server'}), 501
+    fmt = request.args.get('fmt', 'png').lower()
+    if fmt not in CARD_FORMATS:
+        return jsonify({'error': f'fmt must be one of {", ".join(CARD_FORMATS)}'}), 400
+    
+    result, _, _ = cached_wrapped(username, year)
+    if result is None:
+        job, _ = jobs.submit(username, year)
+        if not job.finished:
+            body = job.to_dict(include_result=False)
+            body['status_url'] = f'/api/jobs/{job.id}'
+            response = jsonify(body)
+            response.headers['Retry-After'] = '5'
+            return response, 202
+        if job.error:
+            return jsonify({'error': job.error}), 404
+        result = job.result
+    
+    digest, content = share_cards.get(result, fmt)
+    response = Response(content, mimetype=CARD_FORMATS[fmt])
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = SHARE_CARD_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route('/api/cards/stats')
+def card_stats():
+    return jsonify(share_cards.stats())
+
+@app.route('/api/posters/stats')
+def poster_stats():
+    return jsonify(poster_cache.stats())
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/api/films/stats')
+def film_index_stats():
+    return jsonify(film_index.stats())
+
+@app.route('/api/films/<film_id>')
+def film_metadata(film_id):
+    """What the film index knows about one film"""
+    entry = film_index.lookup([film_id]).get(film_id)
+    if entry is None:
+        return jsonify({'error': 'Film not indexed yet'}), 404
+    return jsonify(entry)
+
+@app.route('/api/refresh/stats')
+def refresh_stats():
+    return jsonify(refresher.stats())
+
+@app.route('/api/parser/stats')
+def parser_stats():
+    return jsonify({'backend': HTML_PARSER, 'parity_sample': PARSER_PARITY_SAMPLE, **parser_parity})
+
+@app.route('/api/http/stats')
+def http_stats():
+    return jsonify({**http_client.stats(), 'rate_limit': outbound_limiter.stats()})
+
+@app.route('/api/drivers/stats')
+def driver_stats():
+    return jsonify({**driver_pool.stats(), 'profile': CHROME_PROFILE})
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None and request.endpoint:
+        elapsed = time.perf_counter() - started
+        request_seconds.observe(elapsed, endpoint=request.endpoint, status=response.status_code)
+        if request.endpoint not in ('health', 'metrics_endpoint', 'static') and not request.endpoint.endswith('stats'):
+            if startup.mark('first_request', elapsed):
+                startup.mark('first_request_done')
+    return response
+
+@metrics.collector
+def component_metrics():
+    """Counters and gauges read from each component's stats() on every scrape"""
+    http = http_client.stats()
+    yield ('wrapped_outbound_requests_total', 'counter', 'Requests sent to letterboxd.com, retries included',
+           [({}, http['requests'])])
+    yield ('wrapped_outbound_responses_total', 'counter', 'Responses from letterboxd.com by status code',
+           [({'code': code}, count) for code, count in http['status_codes'].items()])
+    yield ('wrapped_outbound_retries_total', 'counter', 'Outbound requests retried after a 429/5xx or connection error',
+           [({}, http['retries'])])
+    yield ('wrapped_outbound_errors_total', 'counter', 'Outbound requests that failed after every retry',
+           [({}, http['errors'])])
+    
+    limiter = outbound_limiter.stats()
+    yield ('wrapped_outbound_rate', 'gauge', 'Current outbound request rate limit (per second, 0 when unlimited)',
+           [({}, limiter['rate'])])
+    yield ('wrapped_outbound_throttles_total', 'counter', 'Times letterboxd.com answered 429 and the limiter backed off',
+           [({}, limiter['throttles'])])
+    yield ('wrapped_outbound_waiting', 'gauge', 'Requests waiting on the rate limiter by priority',
+           [({'priority': name}, count) for name, count in limiter['waiting'].items()])
+    yield ('wrapped_outbound_wait_seconds_total', 'counter', 'Time spent waiting on the rate limiter by priority',
+           [({'priority': name}, seconds) for name, seconds in limiter['wait_seconds'].items()])
+    
+    cache = result_cache.stats()
+    yield ('wrapped_cache_lookups_total', 'counter', 'Result cache lookups by outcome',
+           [({'result': 'memory_hit'}, cache['memory_hits']), ({'result': 'disk_hit'}, cache['disk_hits']),
+            ({'result': 'stale_hit'}, cache['stale_hits']), ({'result': 'miss'}, cache['misses'])])
+    yield ('wrapped_cache_hit_ratio', 'gauge', 'Share of result cache lookups served from memory or disk',
+           [({}, cache['hit_rate'])])
+    yield ('wrapped_cache_memory_bytes', 'gauge', 'Serialized size of the in-memory result cache',
+           [({}, cache['memory_bytes'])])
+    
+    refresh = refresher.stats()
+    yield ('wrapped_refresh_queue', 'gauge', 'Background refreshes of stale results by state',
+           [({'state': 'pending'}, refresh['pending']), ({'state': 'running'}, refresh['running'])])
+    yield ('wrapped_refreshes_total', 'counter', 'Background refreshes by outcome',
+           [({'outcome': outcome}, refresh[outcome]) for outcome in ('scheduled', 'started', 'refreshed', 'failed')])
+    
+    films = film_index.stats()
+    yield ('wrapped_film_index_films', 'gauge', 'Films in the shared film index, with details fetched, and waiting for a fetch',
+           [({'state': 'indexed'}, films['films']), ({'state': 'detailed'}, films['detailed']),
+            ({'state': 'pending'}, films['pending'])])
+    yield ('wrapped_film_index_fetches_total', 'counter', 'Film page fetches by outcome (dropped: queue full)',
+           [({'outcome': outcome}, films[outcome]) for outcome in ('fetched', 'failed', 'dropped')])
+    
+    posters = poster_cache.stats()
+    yield ('wrapped_poster_cache_lookups_total', 'counter', 'Poster proxy lookups by outcome',
+           [({'result': 'hit'}, posters['hits']), ({'result': 'miss'}, posters['misses'])])
+    
+    pool = driver_pool.stats()
+    yield ('wrapped_chrome_drivers', 'gauge', 'Chrome drivers by state',
+           [({'state': 'in_use'}, pool['in_use']), ({'state': 'idle'}, pool['idle'])])
+    yield ('wrapped_chrome_pool_utilization', 'gauge', 'Share of the driver pool checked out',
+           [({}, pool['in_use'] / pool['size'] if pool['size'] else 0)])
+    yield ('wrapped_chrome_driver_events_total', 'counter', 'Driver pool lifecycle events',
+           [({'event': event}, pool[event]) for event in ('created', 'recycled', 'replaced', 'checkouts', 'timeouts')])
+    yield ('wrapped_chrome_memory_bytes', 'gauge', 'Resident memory of every live chromedriver and its Chrome processes',
+           [({}, driver_pool.memory_bytes())])
+    
+    yield ('wrapped_startup_seconds', 'gauge',
+           'Cold start of this worker: seconds from process start to imported/warmed/first_healthy/'
+           'first_request_done, and the warm_up and first_request durations',
+           [({'phase': phase}, seconds) for phase, seconds in startup.stats().items()])
+    
+    job_stats = jobs.stats()
+    yield ('wrapped_jobs_active', 'gauge', 'Wrapped jobs queued or running', [({}, job_stats['active'])])
+    yield ('wrapped_jobs_total', 'counter', 'Wrapped jobs by outcome',
+           [({'outcome': outcome}, job_stats[outcome]) for outcome in ('created', 'joined', 'succeeded', 'failed')])
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/health')
 def health():
-    return jsonify({'status': 'ok'})
+    startup.mark('first_healthy')
+    return jsonify({'status': 'ok', 'startup': startup.stats()})
+
+def warm_up(background=True):
+    """Pay the cold-start costs before the first request does
+    
+    Settles the chromedriver path and launches DRIVER_PREWARM browsers,
+    unless the year page is scraped over HTTP only. Called once per worker
+    after fork (see gunicorn.conf.py); in the background by default so health
+    checks are answered meanwhile.
+    """
+    def run():
+        started = time.perf_counter()
+        if YEAR_PAGE_ENGINE != 'http':
+            try:
+                resolve_chromedriver()
+                driver_pool.prewarm(DRIVER_PREWARM)
+            except Exception as e:
+                print(f"Browser warm-up failed: {e}")
+        startup.mark('warm_up', time.perf_counter() - started)
+        startup.mark('warmed')
+        print(f"Worker warmed up: {startup.stats()}")
+    
+    if background:
+        threading.Thread(target=run, name='warm-up', daemon=True).start()
+    else:
+        run()
+
+startup.mark('imported')
 
 if __name__ == '__main__':
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # the reloader's serving child, not its watcher
+        warm_up()
     app.run(debug=True, port=5000)
@@ -0,0 +1 @@
+"""Offline benchmark suite: fixtures, a local Letterboxd stand-in server and the runner"""
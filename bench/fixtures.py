@@ -0,0 +1,275 @@
+"""
+Letterboxd page fixtures for offline benchmarks
+
+Pages recorded with `python -m bench.fixtures record <username> <year>` are
+stored under bench/fixtures/<username>/ and served as-is. For the built-in
+benchmark users the same markup is generated deterministically, so the
+suite runs without any network access.
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Built-in users: (reviews pages, films per page)
+BENCH_USERS = {
+    'smallbench': (1, 12),
+    'heavybench': (55, 12),
+}
+
+GENRES = ['Drama', 'Comedy', 'Horror', 'Thriller', 'Science Fiction', 'Romance', 'Animation', 'Documentary']
+COUNTRIES = ['USA', 'France', 'Japan', 'South Korea', 'UK']
+HIGHS_LOWS = ['Most Popular', 'Most Obscure', 'Longest', 'Shortest', 'Newest', 'Oldest']
+
+PAGE_HEAD = (
+    '<!DOCTYPE html><html><head><title>{title}</title>'
+    + ''.join(f'<script src="/static/js/bundle-{i}.js"></script>' for i in range(12))
+    + '<link rel="stylesheet" href="/static/css/main.css"></head><body>'
+    '<header class="site-header"><nav>' + ''.join(f'<a href="/films/{i}/">Nav {i}</a>' for i in range(30))
+    + '</nav></header>'
+)
+PAGE_FOOT = '<footer>' + ''.join(f'<p>Footer link {i}</p>' for i in range(40)) + '</footer></body></html>'
+
+
+def _film(i):
+    film_id = 10000 + i
+    return film_id, f'film-{film_id}', f'Film Number {film_id}'
+
+
+def _poster(film_id, slug, name):
+    return (f'<div class="react-component poster film-poster" data-film-id="{film_id}" '
+            f'data-film-name="{name}" data-film-slug="{slug}"><img alt="Poster for {name}" '
+            f'src="/empty-poster.png"></div>')
+
+
+def profile_page(username):
+    rng = random.Random(username)
+    bars = ''.join(
+        f'<a class="bar" data-original-title="{rng.randint(1, 90)} {stars} ratings"></a>'
+        for stars in ['½', '★', '★½', '★★', '★★½', '★★★', '★★★½', '★★★★', '★★★★½', '★★★★★']
+    )
+    return (
+        PAGE_HEAD.format(title=username)
+        + f'<div id="content"><section class="profile-header"><img alt="{username.title()}" src="/avatar/{username}.jpg">'
+        f'<span class="displayname">{username.title()}</span>'
+        f'<h4 class="profile-statistic"><span class="value">{rng.randint(100, 3000):,}</span>'
+        f'<span class="definition">Films</span></h4>'
+        f'<h4 class="profile-statistic"><span class="value">{rng.randint(10, 300)}</span>'
+        f'<span class="definition">This year</span></h4></section>'
+        f'<section class="ratings-histogram-chart">{bars}</section></div>'
+        + PAGE_FOOT
+    )
+
+
+def reviews_page(username, year, page):
+    pages, per_page = BENCH_USERS.get(username, (1, 12))
+    if page > pages:
+        return None
+    rng = random.Random(f'{username}:{year}:{page}')
+    items = []
+    for n in range(per_page):
+        film_id, slug, name = _film((page - 1) * per_page + n)
+        # Newest first, spread back across the year
+        watched = date(year, 12, 31) - timedelta(days=((page - 1) * per_page + n) * 365 // (pages * per_page))
+        rating = rng.randint(1, 10)
+        items.append(
+            f'<div class="listitem"><article class="production-viewing" data-object-id="viewing:{film_id + 500000}">'
+            f'<div class="react-component figure" data-film-id="{film_id}" data-item-slug="{slug}" '
+            f'data-item-name="{name}"><img src="/empty-poster.png"></div>'
+            f'<span class="rating rated-{rating}">{"★" * (rating // 2)}{"½" if rating % 2 else ""}</span>'
+            f'<span class="date"><time datetime="{watched.isoformat()}">{watched:%d %b %Y}</time></span>'
+            f'<div class="body-text"><p>{"Review text. " * rng.randint(5, 60)}</p></div></article></div>'
+        )
+    paginator = ''
+    if pages > 1:
+        links = ''.join(f'<li><a href="/{username}/reviews/films/for/{year}/page/{n}/">{n}</a></li>'
+                        for n in sorted({1, 2, 3, page, pages}) if 1 <= n <= pages)
+        paginator = f'<div class="paginate-pages"><ul>{links}</ul></div>'
+        if page < pages:
+            paginator += f'<div class="paginate-nextprev"><a class="next" href="/{username}/reviews/films/for/{year}/page/{page + 1}/">Older</a></div>'
+    return PAGE_HEAD.format(title=f'{username} reviews') + f'<div id="content">{"".join(items)}{paginator}</div>' + PAGE_FOOT
+
+
+def year_page(username, year):
+    rng = random.Random(f'{username}:{year}:year')
+    pages, per_page = BENCH_USERS.get(username, (1, 12))
+    logged = pages * per_page
+    films = [_film(i) for i in range(min(logged, 200))]
+
+    def people(kind, count):
+        return ''.join(
+            f'<li><a href="/{username}/films/diary/for/{year}/with/{kind}/p-{kind}-{i}/">Person {kind.title()} {i}</a>'
+            f' <span>{rng.randint(1, 9)} films</span></li>'
+            for i in range(count)
+        )
+
+    highest = ''.join(
+        f'<li>{_poster(*f)}<span class="rating">★★★★★</span></li>' for f in films[:12]
+    )
+    genres = ''.join(
+        f'<div class="film-breakdown-graph-bar"><a class="film-breakdown-graph-bar-label" '
+        f'href="/{username}/diary/for/{year}/genre/{g.lower().replace(" ", "-")}/">{g}</a>'
+        f'<div class="film-breakdown-graph-bar-value"><span>{rng.randint(1, 60)} films</span></div></div>'
+        for g in GENRES
+    )
+    countries = ''.join(
+        f'<li><a href="/{username}/diary/for/{year}/country/{c.lower()}/">{c}</a> {rng.randint(1, 40)} films</li>'
+        for c in COUNTRIES
+    )
+    highs_lows = ''.join(
+        f'<li class="stat-item"><h4>{label}</h4>{_poster(*rng.choice(films))}</li>' for label in HIGHS_LOWS
+    )
+    grid = ''.join(f'<li>{_poster(*f)}</li>' for f in films)
+    return (
+        PAGE_HEAD.format(title=f'{username} {year} in film')
+        + '<div id="content">'
+        f'<div class="yir-header"><a class="avatar"><img src="/avatar/{username}.jpg"></a>'
+        f'<span class="displayname">{username.title()}</span></div>'
+        '<section class="yir-member-stats">'
+        f'<div class="yir-member-statistic"><span class="value">{logged}</span><span class="definition">Diary entries</span></div>'
+        f'<div class="yir-member-statistic"><span class="value">{logged * 1.9:.1f}</span><span class="definition">Hours</span></div>'
+        f'<div class="yir-member-statistic"><span class="value">{logged // 3}</span><span class="definition">Reviews</span></div>'
+        f'<div class="yir-member-statistic"><span class="value">{logged // 2}</span><span class="definition">Likes</span></div>'
+        '</section>'
+        f'<section class="yir-highest-rated"><ul>{highest}</ul></section>'
+        f'<section class="yir-genres"><div class="film-breakdown-graph">{genres}</div></section>'
+        f'<section class="yir-countries"><ul>{countries}</ul></section>'
+        f'<section class="yir-directors"><ul>{people("director", 10)}</ul></section>'
+        f'<section class="yir-actors"><ul>{people("actor", 16)}</ul></section>'
+        '<section class="yir-milestones"><h3>Milestones</h3><ul>'
+        f'<li class="yir-milestone"><h4>First film</h4>{_poster(*films[0])}<time>Jan 1</time></li>'
+        f'<li class="yir-milestone"><h4>Last film</h4>{_poster(*films[-1])}<time>Dec 31</time></li></ul></section>'
+        f'<section class="yir-highs-lows"><ul>{highs_lows}</ul></section>'
+        f'<section class="yir-films"><ul class="poster-list">{grid}</ul></section>'
+        '</div>'
+        + PAGE_FOOT
+    )
+
+
+def film_page(slug):
+    """A film page with the JSON-LD block, runtime footer and genre tab the film index reads"""
+    film_id = int(slug.rsplit('-', 1)[-1]) if slug.rsplit('-', 1)[-1].isdigit() else 0
+    rng = random.Random(f'film:{slug}')
+    name = f'Film Number {film_id}'
+    genres = rng.sample(GENRES, rng.randint(1, 3))
+    director = f'Person Director {film_id % 10}'
+    release_year = rng.randint(1950, 2024)
+    movie = (
+        '{"@type":"Movie","name":"%s","genre":[%s],"director":[{"@type":"Person","name":"%s",'
+        '"sameAs":"/director/p-director-%d/"}],"releasedEvent":[{"@type":"PublicationEvent","startDate":"%d"}]}'
+        % (name, ','.join(f'"{g}"' for g in genres), director, film_id % 10, release_year)
+    )
+    return (
+        PAGE_HEAD.format(title=name).replace(
+            '</head>', f'<script type="application/ld+json">\n/* <![CDATA[ */\n{movie}\n/* ]]> */\n</script></head>')
+        + f'<div id="content"><section class="film-header"><h1>{name}</h1>'
+        f'<div class="releaseyear"><a href="/films/year/{release_year}/">{release_year}</a></div>'
+        f'<span class="directorlist"><a class="contributor" href="/director/p-director-{film_id % 10}/">{director}</a></span>'
+        '</section>'
+        '<div id="tab-genres"><div class="text-sluglist">'
+        + ''.join(f'<a class="text-slug" href="/films/genre/{g.lower().replace(" ", "-")}/">{g}</a>' for g in genres)
+        + '</div></div>'
+        f'<p class="text-link text-footer">{rng.randint(80, 180)}&nbsp;mins &nbsp; More at <a href="#">IMDb</a></p>'
+        '</div>'
+        + PAGE_FOOT
+    )
+
+
+def recorded_path(username, *parts):
+    return os.path.join(FIXTURES_DIR, username, *parts)
+
+
+def _read_recorded(path):
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def page_for_path(path):
+    """HTML for a Letterboxd URL path, or None if there is no such page"""
+    parts = [p for p in path.split('?')[0].split('/') if p]
+    if not parts:
+        return None
+    if parts[0] == 'film' and len(parts) == 2:
+        return film_page(parts[1])
+    username = parts[0]
+    rest = parts[1:]
+    if username.startswith('missing'):
+        # Stand-in for a user that does not exist
+        return None
+
+    if not rest:
+        return _read_recorded(recorded_path(username, 'profile.html')) or profile_page(username)
+    if rest[0] == 'year' and len(rest) == 2 and rest[1].isdigit():
+        year = int(rest[1])
+        return _read_recorded(recorded_path(username, f'year-{year}.html')) or year_page(username, year)
+    if rest[:3] == ['reviews', 'films', 'for'] and len(rest) >= 4 and rest[3].isdigit():
+        year = int(rest[3])
+        page = int(rest[5]) if len(rest) == 6 and rest[4] == 'page' and rest[5].isdigit() else 1
+        return (_read_recorded(recorded_path(username, f'reviews-{year}-{page}.html'))
+                or reviews_page(username, year, page))
+    return None
+
+
+def record(username, year, base_url='https://letterboxd.com'):
+    """Save a real user's profile, reviews pages and (server-rendered) year page as fixtures"""
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    os.makedirs(recorded_path(username), exist_ok=True)
+
+    def save(url, name):
+        response = session.get(url, timeout=20)
+        if response.status_code != 200:
+            print(f"{url} -> {response.status_code}, not saved")
+            return None
+        with open(recorded_path(username, name), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"Saved {name}")
+        return response.text
+
+    save(f'{base_url}/{username}', 'profile.html')
+    save(f'{base_url}/{username}/year/{year}/', f'year-{year}.html')
+    page = 1
+    while True:
+        suffix = '' if page == 1 else f'page/{page}/'
+        html = save(f'{base_url}/{username}/reviews/films/for/{year}/{suffix}', f'reviews-{year}-{page}.html')
+        if not html or 'class="next"' not in html:
+            break
+        page += 1
+
+
+def save_rendered_year_page(username, year, html):
+    """Store a Selenium-rendered year page (driver.page_source) as a fixture"""
+    os.makedirs(recorded_path(username), exist_ok=True)
+    with open(recorded_path(username, f'year-{year}.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record Letterboxd pages as benchmark fixtures')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help='fetch and save a real user\'s pages')
+    rec.add_argument('username')
+    rec.add_argument('year', type=int)
+    render = sub.add_parser('render', help='render the year page with Selenium and save it')
+    render.add_argument('username')
+    render.add_argument('year', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.username, args.year)
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import app
+        with app.driver_pool.checkout() as driver:
+            driver.get(f'https://letterboxd.com/{args.username}/year/{args.year}/')
+            app.wait_for_year_page(driver)
+            save_rendered_year_page(args.username, args.year, driver.page_source)
+        print('Saved rendered year page')
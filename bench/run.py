@@ -0,0 +1,293 @@
+"""
+Offline benchmark runner
+
+    python -m bench.run                         # everything, results to bench/results/<timestamp>.json
+    python -m bench.run --only reviews_heavy    # one benchmark
+    python -m bench.run --compare bench/results/a.json bench/results/b.json
+
+Scrapers are pointed at the local stand-in server (bench/server.py), so no
+request leaves the machine. The year page goes through the HTTP engine.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench.server import start_server, parse_statuses
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+YEAR = 2024
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        'n': len(ordered),
+        'min_ms': round(ordered[0], 3),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def timeit(fn, iterations, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def dict_rating_stats(films):
+    """FilmColumns.rating_stats the way rating_section used to work: loops over the film dicts and a full sort
+
+    Kept as the baseline for rating_stats_5k_*; gives the same output.
+    """
+    from films import MONTHS, PERCENTILES, nearest_rank
+
+    if not films:
+        return None
+    star_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+    month_counts = {}
+    for f in films:
+        star_counts[min(5, max(1, round(f.get('rating', 0))))] += 1
+        month = MONTHS.get((f.get('watched') or '')[5:7])
+        if month:
+            month_counts[month] = month_counts.get(month, 0) + 1
+
+    sorted_by_rating = sorted(films, key=lambda x: x.get('rating', 0), reverse=True)
+    highest = sorted_by_rating[0]
+    lowest = None
+    for film in reversed(sorted_by_rating):
+        if film.get('title') != highest.get('title'):
+            lowest = film
+            break
+    ratings = [f.get('rating', 0) for f in reversed(sorted_by_rating)]
+    return {
+        'mean': sum(f.get('rating', 0) for f in films) / len(films),
+        'percentiles': {f'p{pct}': ratings[nearest_rank(len(ratings), pct) - 1] for pct in PERCENTILES},
+        'monthly_counts': [month_counts.get(m, 0) for m in range(1, 13)] if month_counts else None,
+        'highest': highest,
+        'lowest': lowest,
+        'total': len(films),
+        'star_distribution': star_counts,
+        'five_star_pct': star_counts[5] / len(films) * 100,
+    }
+
+
+def micro_benchmarks(app, iterations):
+    from bench.fixtures import year_page
+    from films import FilmColumns, np
+
+    year_html = year_page('heavybench', YEAR)
+    profile = app.scrape_profile_basic('heavybench')
+    year_data = app.parse_year_page(app.make_soup(year_html, 'year'), 'heavybench', YEAR)
+    films = app.scrape_all_rated_films('heavybench', YEAR)
+    # A heavy logger's year: the 55-page user's films repeated to 5,000 entries
+    many_films = (films * (5000 // len(films) + 1))[:5000]
+    assert dict_rating_stats(many_films) == FilmColumns(many_films).rating_stats(use_numpy=False)
+
+    benchmarks = {
+        'profile': lambda: timeit(lambda: app.scrape_profile_basic('smallbench'), iterations),
+        'reviews_small': lambda: timeit(lambda: app.scrape_all_rated_films('smallbench', YEAR), iterations),
+        'reviews_heavy': lambda: timeit(lambda: app.scrape_all_rated_films('heavybench', YEAR), max(3, iterations // 4)),
+        # Refresh of an already-synced diary (the warmup run does the full sync)
+        'reviews_heavy_sync': lambda: timeit(lambda: app.sync_rated_films('heavybench', YEAR), iterations),
+        'year_page_parse': lambda: timeit(
+            lambda: app.parse_year_page(app.make_soup(year_html, 'year'), 'heavybench', YEAR), iterations),
+        'aggregate': lambda: timeit(
+            lambda: app.aggregate_wrapped('heavybench', YEAR, profile, year_data, films), iterations * 10),
+        'rating_section_5k': lambda: timeit(lambda: app.rating_section(many_films), iterations * 10),
+        # The same stats three ways: the old dict path, and FilmColumns without and with NumPy
+        'rating_stats_5k_dict': lambda: timeit(lambda: dict_rating_stats(many_films), iterations * 10),
+        'rating_stats_5k_stdlib': lambda: timeit(
+            lambda: FilmColumns(many_films).rating_stats(use_numpy=False), iterations * 10),
+    }
+    if np is not None:
+        benchmarks['rating_stats_5k_numpy'] = lambda: timeit(
+            lambda: FilmColumns(many_films).rating_stats(use_numpy=True), iterations * 10)
+    return benchmarks
+
+
+def load_test(app, concurrency, total_requests, users):
+    """Concurrent end-to-end /api/wrapped calls against a real threaded WSGI server"""
+    import logging
+
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    errors = 0
+    samples = []
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        username = users[i % len(users)]
+        start = time.perf_counter()
+        try:
+            body = session.get(f'{base}/api/wrapped/{username}/{YEAR}?refresh=1', timeout=120).json()
+            ok = 'error' not in body
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            samples.append(elapsed)
+            if not ok:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total_requests)))
+    wall = time.perf_counter() - wall_start
+    server.shutdown()
+
+    result = summarize(samples)
+    result.update({
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(total_requests / wall, 3),
+        'users': users,
+    })
+    return result
+
+
+COLD_START_SCRIPT = """
+import json
+import app
+client = app.app.test_client()
+client.get('/api/health')
+client.get('/api/wrapped/smallbench/%d')
+print(json.dumps(app.startup.stats()))
+""" % YEAR
+
+
+def cold_start(runs):
+    """Fresh interpreters importing the app, answering a health check, then a first wrapped request
+
+    Timings are from process start, as reported by app.startup; p50 is the
+    first request done, with the import and first health check alongside.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    phases = {}
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', COLD_START_SCRIPT], cwd=root, text=True,
+                                         stderr=subprocess.DEVNULL)
+        for phase, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            phases.setdefault(phase, []).append(seconds * 1000)
+
+    result = summarize(phases['first_request_done'])
+    for phase in ('imported', 'first_healthy', 'first_request'):
+        result[f'{phase}_p50_ms'] = round(percentile(sorted(phases[phase]), 50), 3)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)['benchmarks']
+    with open(new_path) as f:
+        new = json.load(f)['benchmarks']
+    print(f"{'benchmark':<20} {'base p50':>10} {'new p50':>10} {'change':>8}")
+    for name in sorted(set(base) & set(new)):
+        before, after = base[name]['p50_ms'], new[name]['p50_ms']
+        change = (after - before) / before * 100 if before else 0
+        print(f"{name:<20} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline Letterboxd Wrapped benchmarks')
+    parser.add_argument('--only', action='append', help='run only these benchmarks (repeatable)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=30, help='stand-in server latency (ms)')
+    parser.add_argument('--jitter', type=float, default=10, help='stand-in server latency jitter (ms)')
+    parser.add_argument('--status', action='append', help='inject a status, e.g. 429:0.02 (code:probability)')
+    parser.add_argument('--concurrency', type=int, default=8, help='load test concurrent clients')
+    parser.add_argument('--requests', type=int, default=48, help='load test total requests')
+    parser.add_argument('--output', help='results file (default bench/results/<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='compare two results files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    server, base_url = start_server(latency_ms=args.latency, jitter_ms=args.jitter,
+                                    statuses=parse_statuses(args.status), seed=1)
+
+    # Configure the app before it is imported: stand-in server, no Chrome, no disk cache,
+    # no poster pre-warming against the real CDN, and no film page fetches or outbound rate limit unless asked for
+    os.environ['LETTERBOXD_URL'] = base_url
+    os.environ.setdefault('YEAR_PAGE_ENGINE', 'http')
+    os.environ['WRAPPED_CACHE_DB'] = ''
+    os.environ['POSTER_PREWARM_WORKERS'] = '0'
+    os.environ.setdefault('FILM_INDEX_WORKERS', '0')
+    os.environ.setdefault('OUTBOUND_RATE', '0')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app
+
+    benchmarks = micro_benchmarks(app, args.iterations)
+    benchmarks['cold_start'] = lambda: cold_start(max(3, args.iterations // 4))
+    benchmarks['load'] = lambda: load_test(app, args.concurrency, args.requests, ['smallbench', 'heavybench'])
+
+    results = {}
+    for name, run in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = run()
+        print(f"  {json.dumps(results[name])}", file=sys.stderr)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'html_parser': app.HTML_PARSER,
+        'year_page_engine': app.YEAR_PAGE_ENGINE,
+        'server': {'latency_ms': args.latency, 'jitter_ms': args.jitter, 'statuses': args.status or []},
+        'benchmarks': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
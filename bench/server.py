@@ -0,0 +1,112 @@
+"""
+Local stand-in for letterboxd.com that serves benchmark fixtures
+
+    python -m bench.server --port 8765 --latency 80 --jitter 20 --status 429:0.05
+
+Point the app at it with LETTERBOXD_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench.fixtures import page_for_path
+
+
+class StandInConfig:
+    """Latency (ms) and injected status codes shared by every request"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, statuses=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.statuses = statuses or []  # [(status_code, probability)]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def injected_status(self):
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+        for status, probability in self.statuses:
+            if roll < probability:
+                return status
+            roll -= probability
+        return None
+
+
+def parse_statuses(specs):
+    """['429:0.05', '503:0.01'] -> [(429, 0.05), (503, 0.01)]"""
+    statuses = []
+    for spec in specs or []:
+        code, _, probability = spec.partition(':')
+        statuses.append((int(code), float(probability or 1)))
+    return statuses
+
+
+def make_handler(config):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Buffer headers and body into one write so Nagle + delayed ACK don't add 40ms
+        wbufsize = 64 * 1024
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(config.delay())
+
+            status = config.injected_status()
+            if status is not None:
+                return self._send(status, b'', {'Retry-After': '1'} if status == 429 else None)
+
+            html = page_for_path(self.path)
+            if html is None:
+                return self._send(404, b'<html><head><title>Page Not Found</title></head></html>')
+            self._send(200, html.encode('utf-8'))
+
+        def _send(self, status, body, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StandInHandler
+
+
+def start_server(port=0, **config_kwargs):
+    """Start the stand-in on a background thread. Returns (server, base_url)"""
+    config = StandInConfig(**config_kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve Letterboxd fixtures locally')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='added latency per request (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='+/- random latency (ms)')
+    parser.add_argument('--status', action='append', help='inject a status, e.g. 429:0.05 (code:probability)')
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+                               statuses=parse_statuses(args.status))
+    print(f"Serving fixtures at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,176 @@
+"""
+Tiered result cache for Letterboxd Wrapped
+Memory-bounded in-process LRU in front of a SQLite store, keyed by (username, year)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+CACHE_DB_PATH = os.environ.get('WRAPPED_CACHE_DB', os.path.join('cache', 'wrapped.sqlite3'))
+CACHE_MEMORY_MB = float(os.environ.get('WRAPPED_CACHE_MEMORY_MB', '64'))
+
+# Past years barely change, so they can live for weeks; the current year keeps moving
+TTL_CURRENT_YEAR = int(os.environ.get('WRAPPED_CACHE_TTL_CURRENT', str(6 * 3600)))
+TTL_PAST_YEAR = int(os.environ.get('WRAPPED_CACHE_TTL_PAST', str(30 * 24 * 3600)))
+# How long past expiry an entry may still be served (marked stale) while it is refreshed
+STALE_FOR = int(os.environ.get('WRAPPED_CACHE_STALE_FOR', str(7 * 24 * 3600)))
+
+
+class ResultCache:
+    """LRU memory tier (bounded by serialized size) backed by an optional SQLite tier"""
+
+    def __init__(self, db_path=CACHE_DB_PATH, memory_bytes=int(CACHE_MEMORY_MB * 1024 * 1024),
+                 ttl_current=TTL_CURRENT_YEAR, ttl_past=TTL_PAST_YEAR, stale_for=STALE_FOR):
+        self.memory_bytes = memory_bytes
+        self.ttl_current = ttl_current
+        self.ttl_past = ttl_past
+        self.stale_for = stale_for
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (payload, size, stored_at, expires_at)
+        self._memory_used = 0
+        self._db = None
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'bypasses': 0,
+            'purges': 0,
+        }
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' key TEXT PRIMARY KEY,'
+                ' payload TEXT NOT NULL,'
+                ' stored_at REAL NOT NULL,'
+                ' expires_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(username, year):
+        return f"{username.lower()}:{year}"
+
+    def ttl_for(self, year):
+        """Shorter TTL for the year still in progress, very long for finished years"""
+        return self.ttl_current if int(year) >= date.today().year else self.ttl_past
+
+    def get(self, username, year):
+        """Return (value, tier) for a fresh entry, or (None, None) on a miss"""
+        value, tier, _ = self.lookup(username, year, stale=False)
+        return value, tier
+
+    def lookup(self, username, year, stale=True):
+        """Return (value, tier, age) - age in seconds since the entry was stored
+
+        With stale, an entry up to stale_for past its expiry comes back with
+        tier 'stale' instead of missing, for the caller to serve while it
+        refreshes. (None, None, None) on a miss.
+        """
+        key = self.make_key(username, year)
+        now = time.time()
+
+        with self._lock:
+            found = None
+            entry = self._memory.get(key)
+            if entry is not None:
+                payload, _, stored_at, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return json.loads(payload), 'memory', now - stored_at
+                if expires_at + self.stale_for > now:
+                    found = (payload, stored_at)
+                else:
+                    self._drop_memory(key)
+
+            # Another worker (or the warm CLI) may have stored a fresher copy on disk
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT payload, stored_at, expires_at FROM results WHERE key = ?', (key,)
+                ).fetchone()
+                if row and row[2] > now:
+                    self._put_memory(key, row[0], row[1], row[2])
+                    self.counters['disk_hits'] += 1
+                    return json.loads(row[0]), 'disk', now - row[1]
+                if row and found is None and row[2] + self.stale_for > now:
+                    self._put_memory(key, row[0], row[1], row[2])
+                    found = (row[0], row[1])
+
+            if stale and found is not None:
+                self.counters['stale_hits'] += 1
+                return json.loads(found[0]), 'stale', now - found[1]
+            self.counters['misses'] += 1
+            return None, None, None
+
+    def set(self, username, year, value):
+        key = self.make_key(username, year)
+        payload = json.dumps(value, ensure_ascii=False)
+        stored_at = time.time()
+        expires_at = stored_at + self.ttl_for(year)
+
+        with self._lock:
+            self._put_memory(key, payload, stored_at, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results (key, payload, stored_at, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, payload, stored_at, expires_at)
+                )
+                self._db.commit()
+            self.counters['stores'] += 1
+
+    def purge(self, username, year):
+        """Remove an entry from both tiers"""
+        key = self.make_key(username, year)
+        with self._lock:
+            self._drop_memory(key)
+            if self._db is not None:
+                self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+                self._db.commit()
+            self.counters['purges'] += 1
+
+    def note_bypass(self):
+        with self._lock:
+            self.counters['bypasses'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_used
+            stats['memory_limit_bytes'] = self.memory_bytes
+            lookups = stats['memory_hits'] + stats['disk_hits'] + stats['stale_hits'] + stats['misses']
+            stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0
+            if self._db is not None:
+                stats['disk_entries'] = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            return stats
+
+    def _put_memory(self, key, payload, stored_at, expires_at):
+        self._drop_memory(key)
+        size = len(payload.encode('utf-8'))
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (payload, size, stored_at, expires_at)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted[1]
+            self.counters['evictions'] += 1
+
+    def _drop_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_used -= entry[1]
@@ -0,0 +1,111 @@
+"""
+Headless Chrome launch profiles
+'lean' is for scraping: DevTools blocks images, fonts, stylesheets, media and
+ad/analytics hosts, navigation returns at DOMContentLoaded, and Chrome's
+background services are off. 'full' loads pages like a normal browser, as
+the baseline to compare against
+"""
+
+import os
+
+CHROME_PROFILE = os.environ.get('CHROME_PROFILE', 'lean').lower()
+
+# Resource groups the lean profile blocks (CHROME_BLOCK), as Network.setBlockedURLs patterns
+BLOCK_PATTERNS = {
+    'images': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*',
+               '*ltrbxd.com/resized/*'],
+    'fonts': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'stylesheets': ['*.css*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'trackers': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*googletagservices.com*',
+        '*googlesyndication.com*', '*doubleclick.net*', '*adservice.google.*', '*amazon-adsystem.com*',
+        '*scorecardresearch.com*', '*quantserve.com*', '*facebook.net*', '*adnxs.com*', '*criteo.*',
+        '*pubmatic.com*', '*rubiconproject.com*', '*moatads.com*', '*taboola.com*', '*openx.net*',
+    ],
+}
+CHROME_BLOCK = [name.strip() for name in os.environ.get(
+    'CHROME_BLOCK', 'images,fonts,stylesheets,media,trackers').split(',') if name.strip()]
+# Extra comma-separated URL patterns to block, e.g. '*cdn.example.com/widgets/*'
+CHROME_BLOCK_EXTRA = [p.strip() for p in os.environ.get('CHROME_BLOCK_EXTRA', '').split(',') if p.strip()]
+
+COMMON_ARGS = [
+    '--headless',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--window-size=1920,1080',
+    '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+]
+
+# Background work a scraping browser never needs
+LEAN_ARGS = [
+    '--blink-settings=imagesEnabled=false',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-client-side-phishing-detection',
+    '--disable-domain-reliability',
+    '--disable-breakpad',
+    '--disable-notifications',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+# Bytes and timings of the current page from the Navigation and Resource Timing APIs.
+# Cross-origin resources without Timing-Allow-Origin report 0 bytes, so this is a floor.
+PAGE_WEIGHT_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0] || {};
+const resources = performance.getEntriesByType('resource');
+return {
+    bytes: (nav.transferSize || 0) + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+    resources: resources.length,
+    dom_content_loaded: (nav.domContentLoadedEventEnd || 0) / 1000,
+    load: (nav.loadEventEnd || 0) / 1000,
+};
+"""
+
+
+def blocked_url_patterns():
+    patterns = []
+    for name in CHROME_BLOCK:
+        patterns.extend(BLOCK_PATTERNS.get(name, []))
+    return patterns + CHROME_BLOCK_EXTRA
+
+
+def chrome_options(profile=CHROME_PROFILE):
+    """Selenium Options for a profile"""
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    for arg in COMMON_ARGS:
+        options.add_argument(arg)
+    if profile == 'lean':
+        for arg in LEAN_ARGS:
+            options.add_argument(arg)
+        # driver.get returns at DOMContentLoaded; wait_for_year_page waits for what the parser reads
+        options.page_load_strategy = 'eager'
+    return options
+
+
+def apply_profile(driver, profile=CHROME_PROFILE):
+    """Per-session DevTools setup, done once when the driver is created"""
+    if profile != 'lean':
+        return
+    patterns = blocked_url_patterns()
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+def page_weight(driver):
+    """{'bytes', 'resources', 'dom_content_loaded', 'load'} for the loaded page, or None if unavailable"""
+    try:
+        return driver.execute_script(PAGE_WEIGHT_SCRIPT)
+    except Exception as e:
+        print(f"Could not read page weight: {e}")
+        return None
@@ -0,0 +1,144 @@
+"""
+Command-line tools for Letterboxd Wrapped
+
+    python cli.py warm alice bob --year 2024            # pre-warm the result cache
+    python cli.py warm --file users.txt --concurrency 8
+    python cli.py export --file users.txt --year 2024 -o wrapped-2024.jsonl
+    python cli.py export --file users.txt --format parquet -o wrapped-2024/ --processes 8
+
+warm scrapes in this process and stores results in the SQLite tier of the
+result cache (WRAPPED_CACHE_DB), which every server worker reads, so run it
+against the same cache file as the server. export runs users across a
+process pool and resumes from OUTPUT.checkpoint when run again (see export.py).
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+
+def read_entries(names, paths, years):
+    """(username, year) pairs from usernames and files of 'username [year ...]' lines, deduplicated"""
+    lines = list(names)
+    for path in paths:
+        with open(path) as f:
+            lines += [line.split('#', 1)[0] for line in f]
+
+    entries = []
+    seen = set()
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        for year in [int(y) for y in parts[1:]] or years:
+            key = (parts[0].lower(), year)
+            if key not in seen:
+                seen.add(key)
+                entries.append((parts[0], year))
+    return entries
+
+
+def warm(args):
+    if args.concurrency:
+        os.environ['JOB_WORKERS'] = str(args.concurrency)
+    if not os.environ.get('WRAPPED_CACHE_DB', 'unset'):
+        print("WRAPPED_CACHE_DB is empty, so warmed results would not outlive this process", file=sys.stderr)
+        return 2
+    import app
+    from ratelimit import BATCH
+
+    entries = read_entries(args.usernames, args.file or [], args.year or [date.today().year])
+    if not entries:
+        print("Nothing to warm: give usernames or --file", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    jobs = []
+    skipped = 0
+    for username, year in entries:
+        if not args.force and app.result_cache.get(username, year)[0] is not None:
+            skipped += 1
+            continue
+        job, _ = app.jobs.submit(username, year, BATCH)
+        jobs.append(job)
+    print(f"Warming {len(jobs)} of {len(entries)} ({skipped} already fresh), "
+          f"{app.JOB_WORKERS} at a time", file=sys.stderr)
+
+    failed = 0
+    for job in jobs:
+        job.wait()
+        seconds = job.finished_at - (job.started_at or job.created_at)
+        if job.error:
+            failed += 1
+            print(f"failed  {job.username} {job.year} ({seconds:.1f}s): {job.error}")
+        else:
+            print(f"warmed  {job.username} {job.year} ({seconds:.1f}s)")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s: {len(jobs) - failed} warmed, "
+          f"{failed} failed, {skipped} already fresh", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def export(args):
+    from export import run_export
+    from ratelimit import OUTBOUND_RATE
+
+    entries = read_entries(args.usernames, args.file or [], args.year or [date.today().year])
+    if not entries:
+        print("Nothing to export: give usernames or --file", file=sys.stderr)
+        return 2
+    try:
+        summary = run_export(entries, args.output, fmt=args.format, processes=args.processes,
+                             outbound_rate=OUTBOUND_RATE if args.rate is None else args.rate,
+                             restart=args.restart, retry_failed=not args.skip_failed,
+                             use_cache=not args.no_cache, report_path=args.report)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if summary['interrupted']:
+        return 130
+    return 1 if summary['failed'] else 0
+
+
+def add_entry_arguments(parser):
+    parser.add_argument('usernames', nargs='*', help='Letterboxd usernames')
+    parser.add_argument('--file', '-f', action='append',
+                        help="file of 'username [year ...]' lines, # for comments (repeatable)")
+    parser.add_argument('--year', type=int, action='append',
+                        help='year for usernames listed without one (repeatable, default this year)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Letterboxd Wrapped command-line tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    warm_parser = commands.add_parser('warm', help='pre-warm the result cache before a traffic spike')
+    add_entry_arguments(warm_parser)
+    warm_parser.add_argument('--concurrency', type=int, help='wrapped jobs at once (default JOB_WORKERS)')
+    warm_parser.add_argument('--force', action='store_true', help='re-scrape results that are still fresh')
+    warm_parser.set_defaults(run=warm)
+
+    export_parser = commands.add_parser('export', help='bulk-export wrapped results to JSONL or Parquet')
+    add_entry_arguments(export_parser)
+    export_parser.add_argument('--output', '-o', required=True,
+                               help='JSONL file, or directory of part files for parquet')
+    export_parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl',
+                               help='parquet needs pyarrow (default jsonl)')
+    export_parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                               help='worker processes, each with its own browser and HTTP session (default 4)')
+    export_parser.add_argument('--rate', type=float,
+                               help='letterboxd.com requests/second shared by all workers (default OUTBOUND_RATE)')
+    export_parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    export_parser.add_argument('--skip-failed', action='store_true', help="don't retry users that failed last run")
+    export_parser.add_argument('--no-cache', action='store_true', help='re-scrape users with a fresh cached result')
+    export_parser.add_argument('--report', help='summary JSON path (default OUTPUT.report.json)')
+    export_parser.set_defaults(run=export)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
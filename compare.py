@@ -0,0 +1,109 @@
+"""
+Cross-user comparison for friend-group wrapped views
+Works on finished wrapped results, so users already in the cache cost nothing
+"""
+
+import itertools
+import os
+
+COMPARE_SHARED_LIMIT = int(os.environ.get('COMPARE_SHARED_LIMIT', '25'))
+
+
+def film_key(film):
+    return film.get('slug') or film.get('title')
+
+
+def rated_by_key(result):
+    """slug -> rated film for one user; older results without rated_films fall back to top films"""
+    films = result.get('rated_films') or [f for f in result.get('top_films', []) if f.get('rating')]
+    return {film_key(f): f for f in films if film_key(f)}
+
+
+def genre_shares(result):
+    """Genre name -> share of the user's genre counts (sums to 1)"""
+    genres = result.get('genres', [])
+    total = sum(g.get('count', 0) for g in genres)
+    if not total:
+        return {}
+    return {g['name']: g.get('count', 0) / total for g in genres}
+
+
+def genre_overlap(a, b):
+    """0-1 overlap of two genre share maps (1 = identical taste mix)"""
+    return round(sum(min(share, b[name]) for name, share in a.items() if name in b), 3)
+
+
+def compare_results(results):
+    """Shared films, genre overlap and rating comparison across {username: wrapped result}"""
+    users = list(results)
+    ratings = {u: rated_by_key(r) for u, r in results.items()}
+    shares = {u: genre_shares(r) for u, r in results.items()}
+
+    # Films rated by two or more users, most widely shared and most disputed first
+    raters = {}
+    for username, films in ratings.items():
+        for key in films:
+            raters.setdefault(key, []).append(username)
+    shared = []
+    for key, who in raters.items():
+        if len(who) < 2:
+            continue
+        scores = {u: ratings[u][key]['rating'] for u in who}
+        film = ratings[who[0]][key]
+        shared.append({
+            'slug': film.get('slug', ''),
+            'title': film.get('title', ''),
+            'ratings': scores,
+            'spread': max(scores.values()) - min(scores.values()),
+        })
+    shared.sort(key=lambda f: (-len(f['ratings']), -f['spread'], f['title']))
+
+    pairs = []
+    for a, b in itertools.combinations(users, 2):
+        common = ratings[a].keys() & ratings[b].keys()
+        gap = None
+        if common:
+            gap = round(sum(abs(ratings[a][k]['rating'] - ratings[b][k]['rating']) for k in common) / len(common), 2)
+        pairs.append({
+            'users': [a, b],
+            'genre_overlap': genre_overlap(shares[a], shares[b]),
+            'shared_films': len(common),
+            'mean_rating_gap': gap,
+        })
+    pairs.sort(key=lambda p: (-p['genre_overlap'], -p['shared_films']))
+
+    # Genres every user watched, by combined share
+    common_genres = set.intersection(*(set(s) for s in shares.values())) if shares else set()
+    common_genres = sorted(common_genres, key=lambda name: -sum(s[name] for s in shares.values()))
+
+    rating_stats = {
+        u: {
+            'average_rating': r.get('average_rating', 0),
+            'total_ratings': r.get('total_ratings', 0),
+            'five_star_pct': round(r.get('five_star_pct', 0), 1),
+            'personality': (r.get('personality') or {}).get('type'),
+        }
+        for u, r in results.items()
+    }
+
+    def leader(metric, lowest=False):
+        candidates = [u for u in users if results[u].get(metric)]
+        if not candidates:
+            return None
+        pick = min if lowest else max
+        return pick(candidates, key=lambda u: results[u][metric])
+
+    return {
+        'users': users,
+        'shared_films': shared[:COMPARE_SHARED_LIMIT],
+        'shared_film_count': len(shared),
+        'common_genres': common_genres,
+        'pairs': pairs,
+        'ratings': rating_stats,
+        'leaders': {
+            'most_films': leader('films_logged'),
+            'most_hours': leader('hours_watched'),
+            'highest_average': leader('average_rating'),
+            'toughest_critic': leader('average_rating', lowest=True),
+        },
+    }
@@ -0,0 +1,157 @@
+"""
+Local per-user diary store
+Rated entries from the reviews pages, kept per (username, year) and keyed by
+viewing, so a refresh only has to fetch the pages newer than what is stored
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DB_PATH
+
+# Walk every page again after this long, to pick up edits and deletions further down
+DIARY_FULL_SYNC_AGE = float(os.environ.get('DIARY_FULL_SYNC_AGE', str(3 * 24 * 3600)))
+
+
+def viewing_key(film):
+    """The stored identity of an entry: its viewing id, or the film when the page has none"""
+    return str(film.get('viewing_id') or f"film:{film.get('film_id') or film.get('slug')}")
+
+
+class DiaryStore:
+    """SQLite tables of rated entries (ordered newest first by position) and when each year was last synced"""
+
+    def __init__(self, db_path=CACHE_DB_PATH, full_sync_age=DIARY_FULL_SYNC_AGE):
+        self.full_sync_age = full_sync_age
+        self._lock = threading.Lock()
+        if db_path and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path or ':memory:', check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS diary_entries ('
+            ' username TEXT NOT NULL,'
+            ' year INTEGER NOT NULL,'
+            ' viewing_id TEXT NOT NULL,'
+            ' film_id TEXT,'
+            ' position INTEGER NOT NULL,'
+            ' entry TEXT NOT NULL,'
+            ' PRIMARY KEY (username, year, viewing_id))'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS diary_syncs ('
+            ' username TEXT NOT NULL,'
+            ' year INTEGER NOT NULL,'
+            ' full_synced_at REAL NOT NULL,'
+            ' synced_at REAL NOT NULL,'
+            ' PRIMARY KEY (username, year))'
+        )
+        self._db.commit()
+        self.counters = {'full_syncs': 0, 'incremental_syncs': 0, 'new_entries': 0}
+
+    def needs_full_sync(self, username, year):
+        """True when the year was never fully synced, or not within full_sync_age"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT full_synced_at FROM diary_syncs WHERE username = ? AND year = ?',
+                (username.lower(), int(year))
+            ).fetchone()
+        return row is None or time.time() - row[0] > self.full_sync_age
+
+    def expire(self, username, year):
+        """Make the next sync of the year walk it in full, keeping the stored entries until then"""
+        with self._lock:
+            self._db.execute('UPDATE diary_syncs SET full_synced_at = 0 WHERE username = ? AND year = ?',
+                             (username.lower(), int(year)))
+            self._db.commit()
+
+    def known(self, username, year, films):
+        """The keys of films that are already stored"""
+        with self._lock:
+            return self._known_locked(username, year, films)
+
+    def replace(self, username, year, films):
+        """Store a complete walk of the year (films newest first), dropping whatever was there"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('DELETE FROM diary_entries WHERE username = ? AND year = ?',
+                             (username.lower(), int(year)))
+            self._insert(username, year, films, 0)
+            self._db.execute(
+                'INSERT OR REPLACE INTO diary_syncs (username, year, full_synced_at, synced_at) VALUES (?, ?, ?, ?)',
+                (username.lower(), int(year), now, now)
+            )
+            self._db.commit()
+            self.counters['full_syncs'] += 1
+
+    def merge(self, username, year, films):
+        """Store the newest pages of the year (films newest first) above everything already stored
+
+        Entries already stored are updated in place, so a changed rating on
+        a fetched page is picked up. Returns the number of new entries.
+        """
+        with self._lock:
+            new = len(films) - len(self._known_locked(username, year, films))
+            top = self._db.execute(
+                'SELECT COALESCE(MAX(position), 0) FROM diary_entries WHERE username = ? AND year = ?',
+                (username.lower(), int(year))
+            ).fetchone()[0]
+            self._insert(username, year, films, top)
+            self._db.execute(
+                'UPDATE diary_syncs SET synced_at = ? WHERE username = ? AND year = ?',
+                (time.time(), username.lower(), int(year))
+            )
+            self._db.commit()
+            self.counters['incremental_syncs'] += 1
+            self.counters['new_entries'] += new
+        return new
+
+    def films(self, username, year):
+        """Every stored entry for the year, newest first"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT entry FROM diary_entries WHERE username = ? AND year = ? ORDER BY position DESC',
+                (username.lower(), int(year))
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def purge(self, username, year):
+        with self._lock:
+            self._db.execute('DELETE FROM diary_entries WHERE username = ? AND year = ?',
+                             (username.lower(), int(year)))
+            self._db.execute('DELETE FROM diary_syncs WHERE username = ? AND year = ?',
+                             (username.lower(), int(year)))
+            self._db.commit()
+
+    def _known_locked(self, username, year, films):
+        keys = [viewing_key(film) for film in films]
+        if not keys:
+            return set()
+        rows = self._db.execute(
+            f'SELECT viewing_id FROM diary_entries WHERE username = ? AND year = ?'
+            f' AND viewing_id IN ({",".join("?" * len(keys))})',
+            (username.lower(), int(year), *keys)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _insert(self, username, year, films, base):
+        """Upsert films in page order, positioned above base (caller holds the lock)"""
+        count = len(films)
+        self._db.executemany(
+            'INSERT OR REPLACE INTO diary_entries (username, year, viewing_id, film_id, position, entry)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (username.lower(), int(year), viewing_key(film), str(film.get('film_id') or ''),
+                 base + count - i, json.dumps(film, ensure_ascii=False))
+                for i, film in enumerate(films)
+            ]
+        )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = self._db.execute('SELECT COUNT(*) FROM diary_entries').fetchone()[0]
+            stats['synced_years'] = self._db.execute('SELECT COUNT(*) FROM diary_syncs').fetchone()[0]
+            return stats
@@ -0,0 +1,248 @@
+"""
+Bounded pool of headless Chrome drivers
+Each caller checks out its own driver, so concurrent requests never share a tab
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+DRIVER_POOL_SIZE = int(os.environ.get('DRIVER_POOL_SIZE', '2'))
+DRIVER_MAX_NAVIGATIONS = int(os.environ.get('DRIVER_MAX_NAVIGATIONS', '50'))
+DRIVER_MAX_RSS_MB = float(os.environ.get('DRIVER_MAX_RSS_MB', '700'))
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get('DRIVER_CHECKOUT_TIMEOUT', '60'))
+# A cancellable checkout re-checks its cancel event this often while the pool is exhausted
+DRIVER_CHECKOUT_POLL = float(os.environ.get('DRIVER_CHECKOUT_POLL', '0.25'))
+
+
+class DriverPoolTimeout(Exception):
+    """Raised when no driver frees up within the checkout timeout"""
+
+
+class DriverCheckoutCancelled(Exception):
+    """Raised when the caller's cancel event is set while it waits for a driver"""
+
+
+def is_webdriver_error(error):
+    # Selenium is only imported once a driver exists, never at module load
+    from selenium.common.exceptions import WebDriverException
+    return isinstance(error, WebDriverException)
+
+
+class _PooledDriver:
+    __slots__ = ('driver', 'navigations', 'created_at')
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.navigations = 0
+        self.created_at = time.time()
+
+
+def _process_tree_rss(pid):
+    """Resident memory (bytes) of a process and all its descendants, via /proc"""
+    total = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            task_dir = f'/proc/{current}/task'
+            for tid in os.listdir(task_dir):
+                with open(f'{task_dir}/{tid}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def driver_rss(driver):
+    """Memory used by chromedriver plus the Chrome processes it spawned (0 if unknown)"""
+    try:
+        return _process_tree_rss(driver.service.process.pid)
+    except AttributeError:
+        return 0
+
+
+class DriverPool:
+    """Checkout/checkin pool that health-checks, replaces and recycles drivers"""
+
+    def __init__(self, factory, size=DRIVER_POOL_SIZE, max_navigations=DRIVER_MAX_NAVIGATIONS,
+                 max_rss_mb=DRIVER_MAX_RSS_MB, checkout_timeout=DRIVER_CHECKOUT_TIMEOUT):
+        self.factory = factory
+        self.size = size
+        self.max_navigations = max_navigations
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.checkout_timeout = checkout_timeout
+
+        # Drivers are launched lazily; the semaphore bounds how many exist at once
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._live = set()  # every driver not yet quit, idle or checked out
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counters = {
+            'created': 0,
+            'recycled': 0,
+            'replaced': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'in_use': 0,
+        }
+
+    @contextmanager
+    def checkout(self, timeout=None, cancel=None):
+        """Borrow a healthy driver for one navigation; blocks while the pool is exhausted
+
+        cancel is an optional threading.Event; setting it stops the wait
+        with DriverCheckoutCancelled instead of holding the caller for the
+        whole timeout.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._take_slot(timeout, cancel):
+            self._count('timeouts')
+            raise DriverPoolTimeout(f'No browser available after {timeout:g}s')
+
+        pooled = None
+        broken = False
+        try:
+            pooled = self._acquire_healthy()
+            self._count('checkouts')
+            self._count('in_use')
+            yield pooled.driver
+        except Exception as e:
+            broken = is_webdriver_error(e)
+            raise
+        finally:
+            if pooled is not None:
+                self._count('in_use', -1)
+                pooled.navigations += 1
+                self._checkin(pooled, broken)
+            self._slots.release()
+
+    def _take_slot(self, timeout, cancel):
+        """Acquire a slot within timeout, waiting in short slices when there is a cancel event to watch"""
+        if cancel is None:
+            return self._slots.acquire(timeout=timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            if cancel.is_set():
+                raise DriverCheckoutCancelled('Cancelled while waiting for a browser')
+            if self._slots.acquire(timeout=min(max(0.0, deadline - time.monotonic()), DRIVER_CHECKOUT_POLL)):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    def prewarm(self, count):
+        """Launch drivers up front and park them idle, up to count and the pool size
+
+        Each launch holds a slot like a checkout does, so racing checkouts
+        can't take the number of live drivers past the pool size. Stops early
+        when every slot is busy - the pool is warm by then anyway.
+        """
+        target = min(count, self.size)
+        while self._slots.acquire(blocking=False):
+            try:
+                with self._lock:
+                    if len(self._live) >= target:
+                        return
+                started = time.perf_counter()
+                pooled = _PooledDriver(self.factory())
+                self._count('created')
+                with self._lock:
+                    self._live.add(pooled)
+                self._idle.put(pooled)
+                print(f"Pre-warmed a Chrome driver in {time.perf_counter() - started:.1f}s")
+            finally:
+                self._slots.release()
+
+    def _acquire_healthy(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                self._count('created')
+                pooled = _PooledDriver(self.factory())
+                with self._lock:
+                    self._live.add(pooled)
+                return pooled
+
+            if self._is_healthy(pooled.driver):
+                return pooled
+            print("Replacing crashed Chrome driver")
+            self._count('replaced')
+            self._retire(pooled)
+
+    def _checkin(self, pooled, broken):
+        if broken or self._closed:
+            if broken:
+                self._count('replaced')
+            self._retire(pooled)
+            return
+
+        if pooled.navigations >= self.max_navigations:
+            reason = f'{pooled.navigations} navigations'
+        elif self.max_rss_bytes and driver_rss(pooled.driver) > self.max_rss_bytes:
+            reason = 'memory threshold'
+        else:
+            self._idle.put(pooled)
+            return
+
+        print(f"Recycling Chrome driver after {reason}")
+        self._count('recycled')
+        self._retire(pooled)
+
+    @staticmethod
+    def _is_healthy(driver):
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def _retire(self, pooled):
+        with self._lock:
+            self._live.discard(pooled)
+        self._quit(pooled.driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self.counters[name] += delta
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+    def memory_bytes(self):
+        """Resident memory of all live drivers and their Chrome processes"""
+        with self._lock:
+            live = list(self._live)
+        return sum(driver_rss(pooled.driver) for pooled in live)
+
+    def shutdown(self):
+        """Quit every idle driver; drivers still checked out are quit on checkin"""
+        self._closed = True
+        while True:
+            try:
+                self._retire(self._idle.get_nowait())
+            except queue.Empty:
+                break
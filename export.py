@@ -0,0 +1,312 @@
+"""
+Bulk offline export of wrapped results
+Runs the same pipeline as /api/wrapped for many users across a process pool -
+each worker process with its own browser pool, HTTP session and share of the
+outbound rate limit - and streams results to JSONL or Parquet as they finish.
+A checkpoint log next to the output lets an interrupted run resume.
+"""
+
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import signal
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; only the parquet format needs it
+    pa = pq = None
+
+# Rows per Parquet part file; each part is written whole, so a crash loses at most one unwritten batch
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', '500'))
+# Seconds between progress lines
+EXPORT_PROGRESS_EVERY = float(os.environ.get('EXPORT_PROGRESS_EVERY', '10'))
+
+# Scalar columns pulled out of each result for Parquet; the whole result is kept as JSON too
+PARQUET_COLUMNS = [
+    ('display_name', 'string', lambda r: r.get('display_name')),
+    ('films_logged', 'int64', lambda r: r.get('films_logged')),
+    ('total_ratings', 'int64', lambda r: r.get('total_ratings')),
+    ('average_rating', 'float64', lambda r: r.get('average_rating')),
+    ('five_star_pct', 'float64', lambda r: r.get('five_star_pct')),
+    ('hours_watched', 'float64', lambda r: r.get('hours_watched')),
+    ('reviews', 'int64', lambda r: r.get('reviews')),
+    ('likes', 'int64', lambda r: r.get('likes')),
+    ('personality', 'string', lambda r: (r.get('personality') or {}).get('type')),
+    ('top_genre', 'string', lambda r: (r.get('genres') or [{}])[0].get('name')),
+    ('top_director', 'string', lambda r: (r.get('directors') or [{}])[0].get('name')),
+]
+
+
+# Worker side: one app per process, imported after the environment is set
+
+_app = None
+
+
+def init_worker(outbound_rate):
+    global _app
+    # Ctrl-C goes to the parent, which lets running users finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ['OUTBOUND_RATE'] = str(outbound_rate)
+    os.environ.setdefault('DRIVER_POOL_SIZE', '1')
+    os.environ.setdefault('POSTER_PREWARM_WORKERS', '0')
+    import app
+    _app = app
+    # Pool workers leave through os._exit, which skips atexit; quit this worker's Chrome on the way out
+    multiprocessing.util.Finalize(None, app.driver_pool.shutdown, exitpriority=10)
+
+
+def export_one(username, year, use_cache):
+    """(username, year, result, error, seconds) for one user, in a worker process"""
+    started = time.perf_counter()
+    result = error = None
+    try:
+        if use_cache:
+            result, _ = _app.result_cache.get(username, year)
+        if result is None:
+            result, error = _app.compute_wrapped(username, year)
+        if result is not None:
+            result = _app.public_result(result)
+    except Exception as e:
+        result, error = None, f'{type(e).__name__}: {e}'
+    return username, year, result, error, time.perf_counter() - started
+
+
+# Parent side
+
+class Checkpoint:
+    """Append-only log of finished (username, year) pairs; done ones are skipped on resume"""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = set()
+        self.failed = {}  # key -> last error
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    key = (entry['username'].lower(), entry['year'])
+                    if entry.get('error'):
+                        self.failed[key] = entry['error']
+                    else:
+                        self.done.add(key)
+                        self.failed.pop(key, None)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, username, year, seconds, error=None):
+        entry = {'username': username, 'year': year, 'seconds': round(seconds, 3), 'at': time.time()}
+        if error:
+            entry['error'] = error
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlSink:
+    """One {"username", "year", "result"} line per user, flushed as it lands"""
+
+    def __init__(self, path, restart=False):
+        if restart and os.path.exists(path):
+            os.remove(path)
+        _trim_partial_line(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, username, year, result):
+        """Store a result; returns the (username, year) pairs now safely on disk"""
+        self._file.write(json.dumps({'username': username, 'year': year, 'result': result},
+                                    ensure_ascii=False) + '\n')
+        self._file.flush()
+        return [(username, year)]
+
+    def close(self):
+        self._file.close()
+        return []
+
+
+class ParquetSink:
+    """A directory of Parquet part files, EXPORT_BATCH_ROWS rows each"""
+
+    def __init__(self, directory, restart=False, batch_rows=EXPORT_BATCH_ROWS):
+        if pa is None:
+            raise RuntimeError('Parquet export needs pyarrow: pip install pyarrow')
+        self.directory = directory
+        self.batch_rows = batch_rows
+        os.makedirs(directory, exist_ok=True)
+        if restart:
+            for name in os.listdir(directory):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(directory, name))
+        self.schema = pa.schema(
+            [('username', pa.string()), ('year', pa.int32())]
+            + [(name, getattr(pa, kind)()) for name, kind, _ in PARQUET_COLUMNS]
+            + [('result', pa.string())]
+        )
+        self._run = time.strftime('%Y%m%d-%H%M%S')
+        self._parts = 0
+        self._rows = []
+
+    def write(self, username, year, result):
+        row = {'username': username, 'year': year, 'result': json.dumps(result, ensure_ascii=False)}
+        for name, _, value in PARQUET_COLUMNS:
+            row[name] = value(result)
+        self._rows.append(row)
+        return self._flush() if len(self._rows) >= self.batch_rows else []
+
+    def close(self):
+        return self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return []
+        path = os.path.join(self.directory, f'part-{self._run}-{self._parts:05d}.parquet')
+        # Written aside and renamed, so a reader (or a resume) never sees half a part
+        pq.write_table(pa.Table.from_pylist(self._rows, schema=self.schema), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._parts += 1
+        written = [(row['username'], row['year']) for row in self._rows]
+        self._rows = []
+        return written
+
+
+def _trim_partial_line(path):
+    """Cut a JSONL file back to its last complete line, after a crash mid-write"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+class ExportReport:
+    """Throughput, failure rate and per-user latency of a run"""
+
+    def __init__(self, total, skipped):
+        self.total = total
+        self.skipped = skipped
+        self.started = time.perf_counter()
+        self.succeeded = 0
+        self.failed = 0
+        self.seconds = []
+        self.errors = Counter()
+
+    def add(self, seconds, error=None):
+        self.seconds.append(seconds)
+        if error:
+            self.failed += 1
+            self.errors[error] += 1
+        else:
+            self.succeeded += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        finished = self.succeeded + self.failed
+        ordered = sorted(self.seconds)
+        return {
+            'total': self.total,
+            'skipped': self.skipped,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'remaining': self.total - self.skipped - finished,
+            'failure_rate': round(self.failed / finished, 4) if finished else 0,
+            'elapsed_seconds': round(elapsed, 1),
+            'users_per_minute': round(finished / elapsed * 60, 2) if elapsed else 0,
+            'user_seconds_p50': round(ordered[len(ordered) // 2], 2) if ordered else None,
+            'user_seconds_p95': round(ordered[int(len(ordered) * 0.95)], 2) if ordered else None,
+            'top_errors': self.errors.most_common(5),
+        }
+
+    def progress(self):
+        s = self.summary()
+        todo = self.total - self.skipped
+        eta = s['remaining'] / s['users_per_minute'] if s['users_per_minute'] else None
+        return (f"[{todo - s['remaining']}/{todo}] {s['users_per_minute']:.1f} users/min, "
+                f"{s['failed']} failed ({s['failure_rate']:.1%})"
+                + (f", ~{eta:.0f} min left" if eta is not None else ''))
+
+
+def run_export(entries, output, fmt='jsonl', processes=4, outbound_rate=10.0, restart=False,
+               retry_failed=True, use_cache=True, report_path=None):
+    """Export (username, year) entries to output, resuming from its checkpoint. Returns the summary"""
+    sink = ParquetSink(output, restart) if fmt == 'parquet' else JsonlSink(output, restart)
+    checkpoint = Checkpoint(output.rstrip('/') + '.checkpoint', restart)
+    skipped = 0
+    todo = []
+    for username, year in entries:
+        key = (username.lower(), year)
+        if key in checkpoint.done or (not retry_failed and key in checkpoint.failed):
+            skipped += 1
+        else:
+            todo.append((username, year))
+
+    report = ExportReport(len(entries), skipped)
+    processes = max(1, min(processes, len(todo) or 1))
+    print(f"Exporting {len(todo)} of {len(entries)} ({skipped} done in an earlier run) "
+          f"with {processes} processes to {output}")
+
+    # Results wait here until the sink has them on disk, then go into the checkpoint
+    waiting = {}
+
+    def handle(future, username, year):
+        try:
+            _, _, result, error, seconds = future.result()
+        except Exception as e:  # the worker process died
+            result, error, seconds = None, f'{type(e).__name__}: {e}', 0.0
+        report.add(seconds, error)
+        if error:
+            print(f"failed  {username} {year}: {error}")
+            checkpoint.record(username, year, seconds, error)
+            return
+        waiting[(username, year)] = seconds
+        for key in sink.write(username, year, result):
+            checkpoint.record(*key, waiting.pop(key))
+
+    # letterboxd.com sees every worker at once, so they split the outbound rate between them
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_worker, initargs=(outbound_rate / processes,))
+    futures = {executor.submit(export_one, username, year, use_cache): (username, year)
+               for username, year in todo}
+    last_progress = time.perf_counter()
+    interrupted = False
+    try:
+        try:
+            for future in as_completed(list(futures)):
+                handle(future, *futures.pop(future))
+                if time.perf_counter() - last_progress >= EXPORT_PROGRESS_EVERY:
+                    print(report.progress())
+                    last_progress = time.perf_counter()
+        except KeyboardInterrupt:
+            interrupted = True
+            print("Interrupted: letting running users finish (Ctrl-C again to stop now)")
+            for future in list(futures):
+                if future.cancel():
+                    del futures[future]
+            for future in as_completed(list(futures)):
+                handle(future, *futures.pop(future))
+    finally:
+        executor.shutdown(wait=not interrupted or not futures, cancel_futures=True)
+        for key in sink.close():
+            checkpoint.record(*key, waiting.pop(key))
+        checkpoint.close()
+
+    summary = report.summary()
+    summary.update({'output': output, 'format': fmt, 'processes': processes, 'interrupted': interrupted})
+    print(report.progress())
+    print(f"Done in {summary['elapsed_seconds']}s: {summary['succeeded']} exported, {summary['failed']} failed "
+          f"({summary['failure_rate']:.1%}), {summary['users_per_minute']} users/min")
+    if summary['remaining']:
+        print(f"{summary['remaining']} not exported; run the same command again to resume")
+    with open(report_path or output.rstrip('/') + '.report.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
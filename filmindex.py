@@ -0,0 +1,204 @@
+"""
+Shared film metadata index
+One row per film_id across every user: slug, title and poster URLs from
+whatever page listed the film, plus release year, runtime, genres and
+directors from its film page, fetched in the background a few at a time.
+Genres, hours and directors for a user can then be worked out from their
+rated films alone, without rendering the year page
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CACHE_DB_PATH
+from ratelimit import BACKGROUND, PriorityTag, outbound_priority
+
+FILM_INDEX_WORKERS = int(os.environ.get('FILM_INDEX_WORKERS', '2'))  # 0 = never fetch film pages
+# Film pages waiting to be fetched; films seen while it is full are queued the next time they turn up
+FILM_INDEX_QUEUE = int(os.environ.get('FILM_INDEX_QUEUE', '2000'))
+# Re-fetch a film's details after this long; leave a failed fetch alone for FILM_INDEX_RETRY_AFTER
+FILM_INDEX_MAX_AGE = float(os.environ.get('FILM_INDEX_MAX_AGE', str(90 * 24 * 3600)))
+FILM_INDEX_RETRY_AFTER = float(os.environ.get('FILM_INDEX_RETRY_AFTER', str(24 * 3600)))
+POSTER_SIZES = (150, 230, 300, 500)
+
+FIELDS = ('film_id', 'slug', 'title', 'posters', 'release_year', 'runtime', 'genres', 'directors',
+          'seen_at', 'fetched_at')
+
+
+class FilmIndex:
+    """SQLite table of film metadata, filled lazily by a bounded background fetcher
+
+    fetch_details(slug) returns {'release_year', 'runtime', 'genres',
+    'directors'} from the film's page, or None; poster_url(film_id, slug,
+    size) builds a poster URL.
+    """
+
+    def __init__(self, fetch_details, poster_url, db_path=CACHE_DB_PATH, workers=FILM_INDEX_WORKERS,
+                 queue_limit=FILM_INDEX_QUEUE, max_age=FILM_INDEX_MAX_AGE, retry_after=FILM_INDEX_RETRY_AFTER):
+        self.fetch_details = fetch_details
+        self.poster_url = poster_url
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._pending = set()  # film ids queued or being fetched
+        self._executor = None
+        if db_path and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path or ':memory:', check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS film_index ('
+            ' film_id TEXT PRIMARY KEY,'
+            ' slug TEXT NOT NULL,'
+            ' title TEXT,'
+            ' posters TEXT,'
+            ' release_year INTEGER,'
+            ' runtime INTEGER,'
+            ' genres TEXT,'
+            ' directors TEXT,'
+            ' seen_at REAL NOT NULL,'
+            ' fetched_at REAL,'
+            ' failed_at REAL)'
+        )
+        self._db.commit()
+        self.counters = {'noted': 0, 'queued': 0, 'dropped': 0, 'fetched': 0, 'failed': 0}
+
+    def note(self, films):
+        """Record the films a page listed, and queue a film-page fetch for those without fresh details"""
+        films = {str(f['film_id']): f for f in films if f.get('film_id') and f.get('slug')}
+        if not films:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT INTO film_index (film_id, slug, title, posters, seen_at) VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT (film_id) DO UPDATE SET slug = excluded.slug,'
+                ' title = COALESCE(NULLIF(excluded.title, \'\'), title), seen_at = excluded.seen_at',
+                [
+                    (film_id, film['slug'], film.get('title') or '', json.dumps(self._posters(film_id, film['slug'])), now)
+                    for film_id, film in films.items()
+                ]
+            )
+            self._db.commit()
+            self.counters['noted'] += len(films)
+            if not self.workers:
+                return
+            due = self._due_locked(list(films), now)
+            for film_id in due:
+                if len(self._pending) >= self.queue_limit:
+                    self.counters['dropped'] += len(due) - due.index(film_id)
+                    break
+                self._pending.add(film_id)
+                self.counters['queued'] += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='film-index')
+                self._executor.submit(self._fetch, film_id, films[film_id]['slug'])
+
+    def _posters(self, film_id, slug):
+        return {str(size): self.poster_url(film_id, slug, size) for size in POSTER_SIZES}
+
+    def _due_locked(self, film_ids, now):
+        """The film ids whose details are missing or older than max_age, and not failing or queued"""
+        rows = self._db.execute(
+            f'SELECT film_id, fetched_at, failed_at FROM film_index'
+            f' WHERE film_id IN ({",".join("?" * len(film_ids))})', film_ids
+        ).fetchall()
+        return [
+            film_id for film_id, fetched_at, failed_at in rows
+            if film_id not in self._pending
+            and (fetched_at is None or now - fetched_at > self.max_age)
+            and (failed_at is None or now - failed_at > self.retry_after)
+        ]
+
+    def _fetch(self, film_id, slug):
+        try:
+            # Film pages queue behind every user-facing request for letterboxd.com
+            with outbound_priority(PriorityTag(BACKGROUND)):
+                details = self.fetch_details(slug)
+        except Exception as e:
+            print(f"Film page fetch failed for {slug}: {e}")
+            details = None
+        with self._lock:
+            self._pending.discard(film_id)
+            if details is None:
+                self._db.execute('UPDATE film_index SET failed_at = ? WHERE film_id = ?', (time.time(), film_id))
+                self.counters['failed'] += 1
+            else:
+                self._db.execute(
+                    'UPDATE film_index SET release_year = ?, runtime = ?, genres = ?, directors = ?,'
+                    ' fetched_at = ?, failed_at = NULL WHERE film_id = ?',
+                    (details.get('release_year'), details.get('runtime'), json.dumps(details.get('genres') or []),
+                     json.dumps(details.get('directors') or []), time.time(), film_id)
+                )
+                self.counters['fetched'] += 1
+            self._db.commit()
+
+    def lookup(self, film_ids):
+        """{film_id: entry} for the indexed films among film_ids"""
+        film_ids = list({str(film_id) for film_id in film_ids if film_id})
+        if not film_ids:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT {", ".join(FIELDS)} FROM film_index WHERE film_id IN ({",".join("?" * len(film_ids))})',
+                film_ids
+            ).fetchall()
+        entries = {}
+        for row in rows:
+            entry = dict(zip(FIELDS, row))
+            for field in ('posters', 'genres', 'directors'):
+                entry[field] = json.loads(entry[field]) if entry[field] else None
+            entries[entry['film_id']] = entry
+        return entries
+
+    def coverage(self, films):
+        """Share of films (entries, rewatches included) whose details are indexed"""
+        if not films:
+            return 0.0
+        entries = self.lookup(f.get('film_id') for f in films)
+        detailed = sum(1 for f in films if (entries.get(str(f.get('film_id'))) or {}).get('fetched_at'))
+        return detailed / len(films)
+
+    def derive(self, films, top=10):
+        """Genre counts, hours watched and top directors from a user's film entries
+
+        Each entry counts once, rewatches included. Hours are scaled up from
+        the entries with a known runtime to all of them, so they are an
+        estimate until every film is indexed. None when no entry has details.
+        """
+        entries = self.lookup(f.get('film_id') for f in films)
+        genres, directors = Counter(), Counter()
+        minutes = timed = detailed = 0
+        for film in films:
+            entry = entries.get(str(film.get('film_id')))
+            if not entry or not entry['fetched_at']:
+                continue
+            detailed += 1
+            genres.update(entry['genres'] or [])
+            directors.update(entry['directors'] or [])
+            if entry['runtime']:
+                minutes += entry['runtime']
+                timed += 1
+        if not detailed:
+            return None
+        return {
+            'genres': [{'name': name, 'count': count} for name, count in genres.most_common(top)],
+            'directors': [{'name': name, 'count': count} for name, count in directors.most_common(top)],
+            'hours_watched': round(minutes / timed * len(films) / 60, 1) if timed else 0,
+            'coverage': round(detailed / len(films), 3),
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['films'] = self._db.execute('SELECT COUNT(*) FROM film_index').fetchone()[0]
+            stats['detailed'] = self._db.execute(
+                'SELECT COUNT(*) FROM film_index WHERE fetched_at IS NOT NULL').fetchone()[0]
+            stats['pending'] = len(self._pending)
+            return stats
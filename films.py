@@ -0,0 +1,127 @@
+"""
+Columnar rated-film collection
+Ratings and watch months sit in parallel arrays beside the film dicts, so the
+rating stats are single passes over numbers - vectorized when NumPy is
+installed - instead of loops and a full sort over per-film dicts
+"""
+
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the array-module path gives the same numbers
+    np = None
+
+PERCENTILES = (25, 50, 75)
+MONTHS = {f'{month:02d}': month for month in range(1, 13)}
+
+
+def nearest_rank(count, pct):
+    """1-based rank of the pct-th percentile among count sorted values"""
+    return max(1, -(-pct * count // 100))
+
+
+class FilmColumns:
+    """Rated films plus their ratings and watch months as parallel arrays
+
+    films keeps the original dicts, so the highest/lowest rated come back
+    whole; the stats only ever read the columns.
+    """
+    __slots__ = ('films', 'ratings', 'months')
+
+    def __init__(self, films):
+        self.films = films
+        self.ratings = array('d', [film.get('rating', 0) for film in films])
+        # Month (1-12) from each ISO 'watched' date, 0 when unknown
+        month_of = MONTHS.get
+        self.months = array('b', [month_of((film.get('watched') or '')[5:7], 0) for film in films])
+
+    def __len__(self):
+        return len(self.films)
+
+    def rating_stats(self, use_numpy=None):
+        """Mean, star distribution, five-star share, percentiles, monthly counts and the highest/lowest rated
+
+        Matches the dict-based stats exactly: stars round half to even like
+        round(), the highest is the first film with the top rating, and the
+        lowest is the last film with the bottom rating whose title differs
+        from the highest's.
+        """
+        if not self.films:
+            return None
+        if use_numpy is None:
+            use_numpy = np is not None
+        stats = self._numpy_stats() if use_numpy else self._python_stats()
+
+        total = len(self.films)
+        counts = stats.pop('star_counts')
+        stats.update({
+            'total': total,
+            'star_distribution': {star: counts[star] for star in range(1, 6)},
+            'five_star_pct': counts[5] / total * 100,
+        })
+        return stats
+
+    def _python_stats(self):
+        ratings = self.ratings
+        # Ratings take a handful of distinct values, so count those and work from the counts
+        by_value = sorted(Counter(ratings).items())
+        star_counts = [0] * 6
+        for rating, count in by_value:
+            star_counts[min(5, max(1, round(rating)))] += count
+        month_counts = [0] * 13
+        for month, count in Counter(self.months).items():
+            month_counts[month] = count
+
+        percentiles = {}
+        seen = 0
+        ranks = [(pct, nearest_rank(len(ratings), pct)) for pct in PERCENTILES]
+        for rating, count in by_value:
+            seen += count
+            while ranks and ranks[0][1] <= seen:
+                percentiles[f'p{ranks.pop(0)[0]}'] = rating
+
+        top, bottom = by_value[-1][0], by_value[0][0]
+        highest = ratings.index(top)
+        lowest = len(ratings) - 1 - ratings[::-1].index(bottom)
+        return {
+            'mean': sum(ratings) / len(ratings),
+            'star_counts': star_counts,
+            'percentiles': percentiles,
+            'monthly_counts': month_counts[1:] if month_counts[0] < len(ratings) else None,
+            'highest': self.films[highest],
+            'lowest': self._lowest(highest, lowest),
+        }
+
+    def _numpy_stats(self):
+        ratings = np.frombuffer(self.ratings, dtype=np.float64)
+        months = np.frombuffer(self.months, dtype=np.int8)
+        stars = np.clip(np.rint(ratings), 1, 5).astype(np.intp)  # rint rounds half to even, like round()
+        star_counts = np.bincount(stars, minlength=6).tolist()
+        month_counts = np.bincount(months, minlength=13).tolist()
+        ranks = [nearest_rank(len(ratings), pct) - 1 for pct in PERCENTILES]
+        ordered = np.partition(ratings, ranks)  # just the percentile positions, not a full sort
+
+        highest = int(np.argmax(ratings))
+        lowest = len(ratings) - 1 - int(np.argmin(ratings[::-1]))
+        return {
+            'mean': float(ratings.sum()) / len(ratings),
+            'star_counts': star_counts,
+            'percentiles': {f'p{pct}': float(ordered[rank]) for pct, rank in zip(PERCENTILES, ranks)},
+            'monthly_counts': month_counts[1:] if month_counts[0] < len(ratings) else None,
+            'highest': self.films[highest],
+            'lowest': self._lowest(highest, lowest),
+        }
+
+    def _lowest(self, highest, lowest):
+        """The lowest rated film, skipping any with the highest's title (None if that is every film)"""
+        title = self.films[highest].get('title')
+        if self.films[lowest].get('title') != title:
+            return self.films[lowest]
+        # Rare: the bottom film shares the top film's title - take the next one up
+        candidates = [i for i, film in enumerate(self.films) if film.get('title') != title]
+        if not candidates:
+            return None
+        bottom = min(self.ratings[i] for i in candidates)
+        return self.films[max(i for i in candidates if self.ratings[i] == bottom)]
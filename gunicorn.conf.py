@@ -0,0 +1,18 @@
+"""
+Gunicorn settings
+The app is imported in each worker after fork (no preload), and each worker
+warms up - chromedriver resolved, browsers launched - before its first request
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('GUNICORN_THREADS', '2'))
+# Scrapes can run long; the Selenium fallback alone may take a minute
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+
+
+def post_worker_init(worker):
+    from app import warm_up
+    warm_up()
@@ -0,0 +1,235 @@
+"""
+Shared HTTP client for letterboxd.com
+Pooled keep-alive connections, jittered retries that honour Retry-After,
+an ETag/Last-Modified cache so unchanged pages cost a 304, and an optional
+process-wide rate limiter that every page request waits on
+"""
+
+import copy
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '16'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '3'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.5'))
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '30'))
+HTTP_VALIDATOR_CACHE_SIZE = int(os.environ.get('HTTP_VALIDATOR_CACHE_SIZE', '1024'))
+# Page text kept for 304s, in characters across all entries; the oldest entries go first
+HTTP_VALIDATOR_CACHE_BYTES = int(os.environ.get('HTTP_VALIDATOR_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpResult:
+    """Status and body of a GET; not_modified is True when the body came from the validator cache"""
+    __slots__ = ('status_code', 'text', 'headers', 'not_modified')
+
+    def __init__(self, status_code, text, headers, not_modified=False):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.not_modified = not_modified
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    def __init__(self, headers=None, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_retries=HTTP_MAX_RETRIES, backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX,
+                 validator_cache_size=HTTP_VALIDATOR_CACHE_SIZE, validator_cache_bytes=HTTP_VALIDATOR_CACHE_BYTES,
+                 limiter=None):
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.validator_cache_size = validator_cache_size
+        self.validator_cache_bytes = validator_cache_bytes
+        self.limiter = limiter
+
+        self._lock = threading.Lock()
+        self._validators = OrderedDict()  # url -> {'etag', 'last_modified', 'text', 'parsed'}
+        self._text_bytes = 0  # length of every cached text
+        self.counters = {
+            'requests': 0,
+            'retries': 0,
+            'not_modified': 0,
+            'errors': 0,
+        }
+        self.status_counts = {}
+
+    def get(self, url, timeout=15):
+        """GET a page, revalidating against the cached copy when we have one"""
+        entry = self._validator_entry(url)
+        response = self._request(url, timeout, self._conditional_headers(entry, need_text=True))
+
+        if response.status_code == 304 and entry and entry.get('text') is not None:
+            return HttpResult(200, entry['text'], response.headers, not_modified=True)
+
+        if response.status_code == 200:
+            self._remember(url, response, text=response.text)
+        return HttpResult(response.status_code, response.text, response.headers)
+
+    def get_parsed(self, url, parse, key=None, timeout=15, remember=True):
+        """GET a page and run parse(text) on it. Returns (status_code, parsed)
+
+        The parsed value is cached next to the page's validators, so an
+        unchanged page costs a 304 and no parse. key names the cached value;
+        it defaults to parse's qualified name, so pass one for lambdas.
+        remember=False leaves the validator cache alone, for pages that are
+        rarely fetched twice and would only push out the ones that are.
+        """
+        key = key or f'{parse.__module__}.{parse.__qualname__}'
+        entry = self._validator_entry(url) if remember else None
+        response = self._request(url, timeout, self._conditional_headers(entry, parse_key=key))
+
+        if response.status_code == 304 and entry and key in entry['parsed']:
+            return 200, copy.deepcopy(entry['parsed'][key])
+
+        if response.status_code != 200:
+            return response.status_code, None
+
+        parsed = parse(response.text)
+        if remember:
+            self._remember(url, response, parsed=(key, copy.deepcopy(parsed)))
+        return 200, parsed
+
+    def get_bytes(self, url, timeout=15):
+        """GET a binary resource (e.g. an image). Returns (status_code, content, content_type)
+
+        These come from the image CDN, not letterboxd.com, so they skip the rate limiter.
+        """
+        response = self._request(url, timeout, None, limited=False)
+        return response.status_code, response.content, response.headers.get('Content-Type', '')
+
+    def _request(self, url, timeout, headers, limited=True):
+        attempt = 0
+        while True:
+            if limited and self.limiter is not None:
+                self.limiter.acquire()
+            self._count('requests')
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count('errors')
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._count_status(response.status_code)
+                retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+                if response.status_code == 429 and limited and self.limiter is not None:
+                    # Slow every request down, not just this one
+                    self.limiter.throttled(retry_after)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt)
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, self.backoff_max))
+                response.close()
+
+            attempt += 1
+            self._count('retries')
+            print(f"Retrying {url} in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _validator_entry(self, url):
+        with self._lock:
+            entry = self._validators.get(url)
+            if entry is not None:
+                self._validators.move_to_end(url)
+            return entry
+
+    @staticmethod
+    def _conditional_headers(entry, need_text=False, parse_key=None):
+        if not entry:
+            return None
+        # Only revalidate when we hold what a 304 would stand in for
+        if need_text and entry.get('text') is None:
+            return None
+        if parse_key and parse_key not in entry['parsed']:
+            return None
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers or None
+
+    def _remember(self, url, response, text=None, parsed=None):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        # A page bigger than the whole text budget keeps only its validators (and parsed values)
+        if text is not None and len(text) > self.validator_cache_bytes:
+            text = None
+
+        with self._lock:
+            entry = self._validators.get(url)
+            if entry is None or entry['etag'] != etag or entry['last_modified'] != last_modified:
+                if entry is not None and entry['text'] is not None:
+                    self._text_bytes -= len(entry['text'])
+                entry = {'etag': etag, 'last_modified': last_modified, 'text': None, 'parsed': {}}
+                self._validators[url] = entry
+            if text is not None:
+                if entry['text'] is not None:
+                    self._text_bytes -= len(entry['text'])
+                entry['text'] = text
+                self._text_bytes += len(text)
+            if parsed is not None:
+                entry['parsed'][parsed[0]] = parsed[1]
+            self._validators.move_to_end(url)
+            while (len(self._validators) > self.validator_cache_size
+                   or self._text_bytes > self.validator_cache_bytes):
+                _, dropped = self._validators.popitem(last=False)
+                if dropped['text'] is not None:
+                    self._text_bytes -= len(dropped['text'])
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _count_status(self, status_code):
+        with self._lock:
+            self.status_counts[status_code] = self.status_counts.get(status_code, 0) + 1
+            if status_code == 304:
+                self.counters['not_modified'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['status_codes'] = {str(code): count for code, count in sorted(self.status_counts.items())}
+            stats['validator_entries'] = len(self._validators)
+            stats['validator_text_bytes'] = self._text_bytes
+            return stats
@@ -0,0 +1,209 @@
+"""
+Background jobs for wrapped generation
+Requests create or join a job keyed by (username, year); a bounded executor runs
+the scrape so web threads return immediately, and identical requests share it
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ratelimit import INTERACTIVE, PRIORITY_NAMES, PriorityTag, outbound_priority
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', '600'))
+
+
+class Job:
+    __slots__ = ('id', 'username', 'year', 'status', 'result', 'error', 'created_at',
+                 'started_at', 'finished_at', 'joined', 'sections', 'priority', '_done', '_changed', '_callbacks')
+
+    def __init__(self, username, year, priority=INTERACTIVE):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.year = year
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.joined = 0  # requests that attached to this job instead of starting their own
+        self.sections = []  # (name, section) partial results, in publish order
+        self.priority = PriorityTag(priority)  # outbound request priority; raised when an interactive request joins
+        self._done = threading.Event()
+        self._changed = threading.Condition()
+        self._callbacks = []
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def wait_for_sections(self, count, timeout=None):
+        """Block until more than count sections are published or the job finishes"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.finished or len(self.sections) > count, timeout)
+
+    def on_done(self, fn):
+        """Call fn(job) once the job finishes - right away if it already has"""
+        with self._changed:
+            if not self.finished:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def publish(self, name, section):
+        """Record a partial result for followers"""
+        with self._changed:
+            self.sections.append((name, section))
+            self._changed.notify_all()
+
+    def follow(self, idle=None):
+        """Yield (name, section) pairs - earlier ones first - until the job finishes
+
+        Yields None whenever idle seconds pass with nothing new, so a
+        streaming caller can send a keepalive.
+        """
+        sent = 0
+        while True:
+            with self._changed:
+                if sent == len(self.sections) and not self.finished:
+                    self._changed.wait(idle)
+                pending = self.sections[sent:]
+                finished = self.finished
+            sent += len(pending)
+            if not pending and not finished:
+                yield None
+            yield from pending
+            if finished and sent == len(self.sections):
+                return
+
+    def to_dict(self, include_result=True, since=None):
+        """Status for the job API; with since, also the sections published after the first since"""
+        data = {
+            'job_id': self.id,
+            'username': self.username,
+            'year': self.year,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'joined': self.joined,
+            'priority': PRIORITY_NAMES[self.priority.level],
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_result and self.result is not None:
+            data['result'] = self.result
+        if since is not None:
+            published = list(self.sections)
+            data['sections'] = [{'name': name, 'data': section} for name, section in published[since:]]
+            data['section_count'] = len(published)
+        return data
+
+
+class JobManager:
+    """Single-flight job registry in front of a bounded executor
+
+    run(username, year, publish) must return (result, error), like build_wrapped;
+    publish(name, section) hands partial results to the job's followers.
+    """
+
+    def __init__(self, run, workers=JOB_WORKERS, retention=JOB_RETENTION):
+        self.run = run
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wrapped-job')
+        self._lock = threading.Lock()
+        self._jobs = {}  # job id -> Job
+        self._active = {}  # (username, year) key -> Job still queued or running
+        self.counters = {'created': 0, 'joined': 0, 'succeeded': 0, 'failed': 0}
+
+    @staticmethod
+    def make_key(username, year):
+        return (username.lower(), int(year))
+
+    def submit(self, username, year, priority=INTERACTIVE):
+        """Return (job, created) - an in-flight job for the same key is joined, not duplicated
+
+        priority orders the job's letterboxd.com requests against other jobs'
+        (see ratelimit); joining a batch job from an interactive request raises it.
+        """
+        key = self.make_key(username, year)
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                job.joined += 1
+                job.priority.raise_to(priority)
+                self.counters['joined'] += 1
+                return job, False
+
+            job = Job(username, year, priority)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self.counters['created'] += 1
+
+        self._executor.submit(self._execute, job, key)
+        return job, True
+
+    def completed(self, username, year, result):
+        """Record an already-available result (e.g. a cache hit) as a finished job"""
+        job = Job(username, year)
+        job.started_at = job.finished_at = job.created_at
+        self._finish(job, result, None)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _execute(self, job, key):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            with outbound_priority(job.priority):
+                result, error = self.run(job.username, job.year, job.publish)
+        except Exception as e:
+            print(f"Wrapped job {job.id} crashed: {e}")
+            result, error = None, 'Something went wrong, please try again'
+
+        with self._lock:
+            self._active.pop(key, None)
+            self.counters['failed' if error else 'succeeded'] += 1
+        job.finished_at = time.time()
+        self._finish(job, result, error)
+
+    @staticmethod
+    def _finish(job, result, error):
+        with job._changed:
+            job.result = result
+            job.error = error
+            job.status = 'error' if error else 'done'
+            job._done.set()
+            job._changed.notify_all()
+            callbacks, job._callbacks = job._callbacks, []
+        for fn in callbacks:
+            fn(job)
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window (caller holds the lock)"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['active'] = len(self._active)
+            stats['retained'] = len(self._jobs)
+            return stats
@@ -0,0 +1,322 @@
+"""
+Poster proxy cache
+Posters are fetched from the Letterboxd CDN once, stored content-addressed on
+disk, and served at the sizes the slides display - re-encoded as WebP/AVIF
+when Pillow is installed
+"""
+
+import functools
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+POSTER_CACHE_DIR = os.environ.get('POSTER_CACHE_DIR', os.path.join('cache', 'posters'))
+POSTER_WIDTHS = tuple(sorted(int(w) for w in os.environ.get('POSTER_WIDTHS', '150,230,300,500').split(',')))
+POSTER_QUALITY = int(os.environ.get('POSTER_QUALITY', '80'))
+POSTER_PREWARM_WORKERS = int(os.environ.get('POSTER_PREWARM_WORKERS', '2'))
+# Least recently used posters are deleted once the objects pass this many bytes (0 = no limit)
+POSTER_CACHE_MAX_BYTES = int(os.environ.get('POSTER_CACHE_MAX_BYTES', str(1024 ** 3)))
+
+POSTER_HOSTS = ('a.ltrbxd.com', 's.ltrbxd.com')
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+CDN_SIZE = re.compile(r'-0-\d+-0-\d+-crop')
+POSTER_PATH = re.compile(r'/resized/film-poster/(?:\d/)+\d+-[a-z0-9-]+-0-\d+-0-\d+-crop\.jpg')
+
+
+@functools.lru_cache(maxsize=None)
+def pillow():
+    """PIL's Image module, imported on first use so app startup doesn't load Pillow; None without it"""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow is optional; without it the CDN does the resizing
+        return None
+    try:
+        import pillow_avif  # noqa: F401 - registers AVIF on Pillow builds without it
+    except ImportError:
+        pass
+    return Image
+
+
+def supported_formats():
+    """Formats we can encode, best first; JPEG is always available"""
+    Image = pillow()
+    if Image is None:
+        return ('jpeg',)
+    Image.init()
+    return tuple(fmt for fmt in ('avif', 'webp') if fmt.upper() in Image.SAVE) + ('jpeg',)
+
+
+def snap_width(width):
+    """Smallest configured width at least as wide as asked, so variants stay few"""
+    for allowed in POSTER_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return POSTER_WIDTHS[-1]
+
+
+def cdn_url_at(src, width):
+    """The same poster at another size - the CDN serves any 2:3 crop"""
+    return CDN_SIZE.sub(f'-0-{width}-0-{int(width * 1.5)}-crop', src)
+
+
+def canonical_poster_url(src):
+    """The CDN film poster URL without its query string, or None if src is not one"""
+    parsed = urlparse(src or '')
+    if parsed.scheme != 'https' or parsed.hostname not in POSTER_HOSTS or not POSTER_PATH.fullmatch(parsed.path):
+        return None
+    return f'https://{parsed.hostname}{parsed.path}'
+
+
+def is_poster_url(src):
+    return canonical_poster_url(src) is not None
+
+
+class PosterCache:
+    """Content-addressed poster store: refs map (url, width, format) to a digest, objects hold the bytes
+
+    fetch(url) must return (status_code, content, content_type), like HttpClient.get_bytes.
+    Objects are kept under max_bytes by deleting the least recently read;
+    every worker process evicts from the same directory.
+    """
+
+    def __init__(self, fetch, root=POSTER_CACHE_DIR, workers=POSTER_PREWARM_WORKERS, max_bytes=POSTER_CACHE_MAX_BYTES):
+        self.fetch = fetch
+        self.root = root
+        self.max_bytes = max_bytes
+        self._formats = None
+        self._lock = threading.Lock()
+        self._bytes = None  # size of the objects, measured on the first write
+        self._evicting = False
+        self._executor = None  # workers=0 turns pre-warming off
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='poster-prewarm')
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'upstream_fetches': 0,
+            'upstream_errors': 0,
+            'prewarmed': 0,
+            'evicted': 0,
+        }
+
+    @property
+    def formats(self):
+        # Probing Pillow's encoders loads every image plugin, so it waits for the first poster
+        if self._formats is None:
+            self._formats = supported_formats()
+        return self._formats
+
+    def negotiate(self, accept, requested=None):
+        """Pick the output format: an explicit ?fmt= we support, else the best the client accepts"""
+        if requested in self.formats:
+            return requested
+        for fmt in self.formats:
+            if fmt != 'jpeg' and CONTENT_TYPES[fmt] in (accept or ''):
+                return fmt
+        return 'jpeg'
+
+    def get(self, src, width, fmt):
+        """Return (digest, content) for a poster variant, or (None, None) if the CDN fails"""
+        src = canonical_poster_url(src)
+        if src is None:
+            return None, None
+        # One set of variants per poster, whatever size the URL names
+        src = cdn_url_at(src, POSTER_WIDTHS[-1])
+        width = snap_width(width)
+        key = f'{src}|{width}|{fmt}'
+        digest = self._read_ref(key)
+        content = self._read_object(digest) if digest else None
+        if content is not None:
+            self._count('hits')
+            return digest, content
+
+        self._count('misses')
+        content = self._render(src, width, fmt)
+        if content is None:
+            return None, None
+        digest = self._write_object(content)
+        self._write_ref(key, digest)
+        return digest, content
+
+    def prewarm(self, posters, fmt=None):
+        """Fetch and encode (url, width) pairs in the background"""
+        if self._executor is None:
+            return
+        fmt = fmt or self.formats[0]
+        for src, width in posters:
+            if src and is_poster_url(src):
+                self._executor.submit(self._prewarm_one, src, width, fmt)
+
+    def _prewarm_one(self, src, width, fmt):
+        try:
+            if self.get(src, width, fmt)[0]:
+                self._count('prewarmed')
+        except Exception as e:
+            print(f"Poster prewarm failed for {src}: {e}")
+
+    def _render(self, src, width, fmt):
+        Image = pillow()
+        if Image is None or fmt == 'jpeg' and width == POSTER_WIDTHS[-1]:
+            return self._source(cdn_url_at(src, width))
+
+        # One full-size source per poster; every smaller variant is cut from it locally
+        original = self._source(cdn_url_at(src, POSTER_WIDTHS[-1]))
+        if original is None:
+            return None
+        image = Image.open(io.BytesIO(original))
+        image.draft('RGB', (width, width * 2))  # JPEG: decode at reduced scale when possible
+        image = image.convert('RGB')
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if fmt == 'jpeg':
+            image.save(out, 'JPEG', quality=POSTER_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(out, fmt.upper(), quality=POSTER_QUALITY)
+        return out.getvalue()
+
+    def _source(self, url):
+        """CDN bytes for url, fetched once and kept as an object of their own"""
+        key = f'{url}|source'
+        digest = self._read_ref(key)
+        content = self._read_object(digest) if digest else None
+        if content is not None:
+            return content
+
+        self._count('upstream_fetches')
+        try:
+            status, content, content_type = self.fetch(url)
+        except Exception as e:
+            print(f"Poster fetch failed for {url}: {e}")
+            status, content, content_type = None, None, ''
+        if status != 200 or not content_type.startswith('image/'):
+            self._count('upstream_errors')
+            return None
+        self._write_ref(key, self._write_object(content))
+        return content
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def _ref_path(self, key):
+        return os.path.join(self.root, 'refs', hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read_object(self, digest):
+        path = self._object_path(digest)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path)  # mtime is the last read, for eviction
+            return content
+        except OSError:
+            return None
+
+    def _write_object(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, content)
+            self._grow(len(content))
+        return digest
+
+    def _grow(self, size):
+        """Count a new object's bytes, evicting when the store is over max_bytes"""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._objects())
+            else:
+                self._bytes += size
+            if self._bytes <= self.max_bytes or self._evicting:
+                return
+            self._evicting = True
+        try:
+            self._evict()
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def _objects(self):
+        """(mtime, size, path) of every stored object"""
+        objects = []
+        try:
+            shards = list(os.scandir(os.path.join(self.root, 'objects')))
+        except OSError:
+            return objects
+        for shard in shards:
+            try:
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        objects.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return objects
+
+    def _evict(self):
+        """Delete the least recently read objects down to 90% of max_bytes, then the refs to them"""
+        objects = sorted(self._objects())
+        total = sum(size for _, size, _ in objects)
+        removed = set()
+        for _, size, path in objects:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed.add(os.path.basename(path))
+
+        if removed:
+            refs = os.path.join(self.root, 'refs')
+            for name in os.listdir(refs) if os.path.isdir(refs) else []:
+                path = os.path.join(refs, name)
+                try:
+                    with open(path) as f:
+                        if f.read().strip() in removed:
+                            os.remove(path)
+                except OSError:
+                    continue
+        with self._lock:
+            self._bytes = total
+            self.counters['evicted'] += len(removed)
+
+    def _read_ref(self, key):
+        try:
+            with open(self._ref_path(key)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_ref(self, key, digest):
+        self._write_atomic(self._ref_path(key), digest.encode('ascii'))
+
+    @staticmethod
+    def _write_atomic(path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['formats'] = list(self.formats)
+        stats['widths'] = list(POSTER_WIDTHS)
+        stats['bytes'] = self._bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,168 @@
+"""
+Process-wide outbound rate limiter for letterboxd.com
+A token bucket shared by the HTTP client and Selenium navigations. Waiters are
+served in priority order (interactive, then batch, then background), and a 429
+pauses everyone and halves the rate, which then climbs back gradually
+"""
+
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+OUTBOUND_RATE = float(os.environ.get('OUTBOUND_RATE', '10'))  # requests/second, 0 = unlimited
+OUTBOUND_BURST = float(os.environ.get('OUTBOUND_BURST', '20'))
+OUTBOUND_MIN_RATE = float(os.environ.get('OUTBOUND_MIN_RATE', '0.5'))
+OUTBOUND_PENALTY = float(os.environ.get('OUTBOUND_PENALTY', '5'))  # pause after a 429 without Retry-After
+OUTBOUND_RECOVERY = float(os.environ.get('OUTBOUND_RECOVERY', '60'))  # seconds to climb back to full rate
+
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch', BACKGROUND: 'background'}
+
+
+class PriorityTag:
+    """Mutable priority shared by all the work for one request, so a joiner can raise it"""
+    __slots__ = ('level',)
+
+    def __init__(self, level=INTERACTIVE):
+        self.level = level
+
+    def raise_to(self, level):
+        self.level = min(self.level, level)
+
+
+# The priority of whatever outbound work the current context does
+current_priority = contextvars.ContextVar('outbound_priority', default=None)
+
+
+@contextmanager
+def outbound_priority(tag):
+    """Run the block's outbound requests at tag's priority"""
+    token = current_priority.set(tag)
+    try:
+        yield tag
+    finally:
+        current_priority.reset(token)
+
+
+def submit_with_context(executor, fn, *args):
+    """executor.submit that carries the caller's priority (and other context vars) into the worker"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class RateLimiter:
+    def __init__(self, rate=OUTBOUND_RATE, burst=OUTBOUND_BURST, min_rate=OUTBOUND_MIN_RATE,
+                 penalty=OUTBOUND_PENALTY, recovery=OUTBOUND_RECOVERY):
+        self.target_rate = rate
+        self.burst = max(1.0, burst)
+        self.min_rate = min(min_rate, rate) if rate else 0
+        self.penalty = penalty
+        self.recovery = recovery
+
+        self._cond = threading.Condition()
+        self._rate = rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self.counters = {'acquired': 0, 'waited': 0, 'throttles': 0}
+        self.wait_seconds = {name: 0.0 for name in PRIORITY_NAMES.values()}
+
+    @property
+    def enabled(self):
+        return self.target_rate > 0
+
+    def acquire(self, cost=1, level=None):
+        """Block until cost tokens are ours. Returns the seconds spent waiting"""
+        if not self.enabled:
+            return 0.0
+        if level is None:
+            tag = current_priority.get()
+            level = tag.level if tag is not None else INTERACTIVE
+        cost = min(cost, self.burst)
+        ticket = (level, next(self._seq))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] == ticket:
+                        if now >= self._paused_until and self._tokens >= cost:
+                            heapq.heappop(self._waiting)
+                            self._tokens -= cost
+                            break
+                        delay = max(self._paused_until - now, (cost - self._tokens) / self._rate)
+                        self._cond.wait(delay)
+                    else:
+                        # Someone ahead of us; they wake us when they are served
+                        self._cond.wait()
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                raise
+            finally:
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self.counters['acquired'] += 1
+            if waited > 0.001:
+                self.counters['waited'] += 1
+            self.wait_seconds[PRIORITY_NAMES.get(level, 'background')] += waited
+        return waited
+
+    def throttled(self, retry_after=None):
+        """A 429 came back: pause everyone and halve the rate"""
+        if not self.enabled:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            # Requests already in flight when the first 429 landed extend the pause but don't halve again
+            if now >= self._paused_until:
+                self._rate = max(self.min_rate, self._rate / 2)
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else self.penalty
+            self._paused_until = max(self._paused_until, now + pause)
+            self.counters['throttles'] += 1
+            self._cond.notify_all()
+        print(f"Throttled by letterboxd.com: pausing {pause:.1f}s, rate now {self._rate:.2f}/s")
+
+    def _refill(self, now):
+        if now < self._paused_until:
+            self._updated = now
+            return
+        # Nothing accrues while paused
+        elapsed = now - max(self._updated, self._paused_until)
+        self._updated = now
+        # Additive recovery towards the configured rate after a throttle
+        if self._rate < self.target_rate and self.recovery > 0:
+            self._rate = min(self.target_rate, self._rate + self.target_rate * elapsed / self.recovery)
+        self._tokens = min(self.burst, self._tokens + elapsed * self._rate)
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for level, _ in self._waiting:
+                waiting[PRIORITY_NAMES.get(level, 'background')] += 1
+            stats = dict(self.counters)
+            stats.update({
+                'enabled': self.enabled,
+                'rate': round(self._rate, 3),
+                'target_rate': self.target_rate,
+                'burst': self.burst,
+                'tokens': round(self._tokens, 2),
+                'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 2),
+                'waiting': waiting,
+                'wait_seconds': {name: round(seconds, 3) for name, seconds in self.wait_seconds.items()},
+            })
+            return stats
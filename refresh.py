@@ -0,0 +1,139 @@
+"""
+Background refresh scheduler for cached wrapped results
+Requests for a stale (or, when popular, nearly expired) result queue a
+refresh. Refreshes start most-requested and most-overdue first, and no more
+than REFRESH_WORKERS run at once, so they never take every job worker from
+users
+"""
+
+import os
+import threading
+import time
+
+REFRESH_WORKERS = int(os.environ.get('REFRESH_WORKERS', '2'))
+# Request counts decay by half over this many seconds
+REFRESH_DEMAND_HALF_LIFE = float(os.environ.get('REFRESH_DEMAND_HALF_LIFE', '3600'))
+# Entries requested at least REFRESH_AHEAD_DEMAND times (decayed) are refreshed this long before they expire
+REFRESH_AHEAD = float(os.environ.get('REFRESH_AHEAD', '600'))
+REFRESH_AHEAD_DEMAND = float(os.environ.get('REFRESH_AHEAD_DEMAND', '3'))
+# After a failed refresh, leave the key alone this long
+REFRESH_RETRY_AFTER = float(os.environ.get('REFRESH_RETRY_AFTER', '300'))
+REFRESH_MAX_TRACKED = int(os.environ.get('REFRESH_MAX_TRACKED', '10000'))
+
+
+class RefreshScheduler:
+    """Demand-weighted refresh queue with a concurrency budget
+
+    submit(username, year) must start (or join) the refresh and return
+    (job, created), like JobManager.submit; the job's on_done reports back.
+    """
+
+    def __init__(self, submit, workers=REFRESH_WORKERS, half_life=REFRESH_DEMAND_HALF_LIFE,
+                 ahead=REFRESH_AHEAD, ahead_demand=REFRESH_AHEAD_DEMAND, retry_after=REFRESH_RETRY_AFTER,
+                 max_tracked=REFRESH_MAX_TRACKED):
+        self.submit = submit
+        self.workers = workers
+        self.half_life = half_life
+        self.ahead = ahead
+        self.ahead_demand = ahead_demand
+        self.retry_after = retry_after
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._demand = {}  # key -> (decayed request count, updated_at)
+        self._pending = {}  # key -> (username, year, expires_at)
+        self._running = set()
+        self._retry_at = {}  # key -> time a failed refresh may be tried again
+        self.counters = {'scheduled': 0, 'started': 0, 'refreshed': 0, 'failed': 0}
+
+    @staticmethod
+    def make_key(username, year):
+        return (username.lower(), int(year))
+
+    def observe(self, username, year, age=None, ttl=None):
+        """Count a request; queue a refresh when the cached entry (age seconds old, ttl) is due
+
+        A stale entry is always due; a fresh one only when it expires within
+        `ahead` seconds and is requested often. age is None on a cache miss.
+        """
+        if not self.workers:
+            return
+        key = self.make_key(username, year)
+        now = time.time()
+        with self._lock:
+            demand = self._demand_locked(key, now) + 1
+            self._demand[key] = (demand, now)
+            if len(self._demand) > self.max_tracked:
+                self._forget_locked(now)
+            if age is None or ttl is None:
+                return
+            expires_in = ttl - age
+            due = expires_in <= 0 or (expires_in <= self.ahead and demand >= self.ahead_demand)
+            if (not due or key in self._pending or key in self._running
+                    or self._retry_at.get(key, 0) > now):
+                return
+            self._retry_at.pop(key, None)
+            self._pending[key] = (username, year, now + expires_in)
+            self.counters['scheduled'] += 1
+        self._dispatch()
+
+    def _demand_locked(self, key, now):
+        demand, updated_at = self._demand.get(key, (0.0, now))
+        if self.half_life > 0:
+            demand *= 0.5 ** ((now - updated_at) / self.half_life)
+        return demand
+
+    def _score_locked(self, key, now):
+        """Requests (decayed) weighted by how overdue the entry is, in hours"""
+        overdue = max(0.0, now - self._pending[key][2])
+        return self._demand_locked(key, now) * (1 + overdue / 3600)
+
+    def _forget_locked(self, now):
+        """Drop the least requested half of the tracked keys, keeping queued and running ones"""
+        ranked = sorted(self._demand, key=lambda key: self._demand_locked(key, now))
+        for key in ranked[:len(ranked) // 2]:
+            if key not in self._pending and key not in self._running:
+                del self._demand[key]
+        for key in [key for key, at in self._retry_at.items() if at <= now]:
+            del self._retry_at[key]
+
+    def _dispatch(self):
+        """Start the highest-scoring queued refreshes while the budget allows"""
+        while True:
+            with self._lock:
+                if len(self._running) >= self.workers or not self._pending:
+                    return
+                # Scores move with time and demand, so rank at dispatch; the queue is short
+                now = time.time()
+                key = max(self._pending, key=lambda key: self._score_locked(key, now))
+                username, year, _ = self._pending.pop(key)
+                self._running.add(key)
+                self.counters['started'] += 1
+            try:
+                job, _ = self.submit(username, year)
+            except Exception as e:
+                print(f"Could not start refresh of {username}/{year}: {e}")
+                self._finished(key, None)
+                continue
+            job.on_done(lambda job, key=key: self._finished(key, job))
+
+    def _finished(self, key, job):
+        with self._lock:
+            self._running.discard(key)
+            if job is None or job.error:
+                self._retry_at[key] = time.time() + self.retry_after
+                self.counters['failed'] += 1
+            else:
+                self.counters['refreshed'] += 1
+        self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                'workers': self.workers,
+                'pending': len(self._pending),
+                'running': len(self._running),
+                'tracked': len(self._demand),
+                'backing_off': sum(1 for at in self._retry_at.values() if at > time.time()),
+            })
+            return stats
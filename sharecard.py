@@ -0,0 +1,229 @@
+"""
+Server-rendered share card
+One PNG/WebP with the stats, top posters, personality and era, cached on disk
+by a hash of the data drawn on it
+"""
+
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SHARE_CARD_DIR = os.environ.get('SHARE_CARD_DIR', os.path.join('cache', 'cards'))
+SHARE_CARD_FONT = os.environ.get('SHARE_CARD_FONT', 'DejaVuSans.ttf')
+SHARE_CARD_FONT_BOLD = os.environ.get('SHARE_CARD_FONT_BOLD', 'DejaVuSans-Bold.ttf')
+SHARE_CARD_QUALITY = int(os.environ.get('SHARE_CARD_QUALITY', '85'))
+
+# Bump when the layout changes so cached cards are redrawn
+CARD_VERSION = 1
+CARD_SIZE = (1080, 1350)
+CARD_FORMATS = {'png': 'image/png', 'webp': 'image/webp'}
+
+# Colours from the page's CSS variables
+BG = (10, 10, 10)
+SURFACE = (20, 20, 20)
+ORANGE = (255, 128, 0)
+GREEN = (0, 224, 84)
+PINK = (255, 107, 157)
+BLUE = (64, 188, 244)
+TEXT = (255, 255, 255)
+TEXT_DIM = (179, 179, 179)
+TEXT_MUTED = (102, 102, 102)
+
+
+def card_fields(result):
+    """Just the data the card draws - the cache key ignores everything else in the result"""
+    personality = result.get('personality') or {}
+    era = result.get('movie_era') or {}
+    return {
+        'year': result.get('year'),
+        'display_name': result.get('display_name') or result.get('username', ''),
+        'films_logged': result.get('films_logged', 0),
+        'hours_watched': result.get('hours_watched', 0),
+        'average_rating': result.get('average_rating', 0),
+        'posters': [
+            {'title': f.get('title', ''), 'poster': f.get('poster', '')}
+            for f in result.get('top_films', [])[:4]
+        ],
+        'personality': {'type': personality.get('type', ''), 'tagline': personality.get('tagline', '')},
+        'era': {'era': era.get('era', ''), 'subtitle': era.get('subtitle', '')},
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def pillow():
+    """(Image, ImageDraw, ImageFont), imported on the first draw so app startup doesn't load Pillow"""
+    from PIL import Image, ImageDraw, ImageFont
+    return Image, ImageDraw, ImageFont
+
+
+def card_digest(fields, fmt):
+    payload = json.dumps([CARD_VERSION, fmt, fields], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_font(name, size):
+    _, _, ImageFont = pillow()
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def fit_text(draw, text, font_name, size, max_width, min_size=28):
+    """Largest font (down to min_size) that fits text in max_width, ellipsizing past that"""
+    while True:
+        font = load_font(font_name, size)
+        if draw.textlength(text, font=font) <= max_width:
+            return text, font
+        if size > min_size:
+            size -= 4
+            continue
+        while text and draw.textlength(text + '…', font=font) > max_width:
+            text = text[:-1]
+        return text + '…', font
+
+
+def draw_centered(draw, y, text, font_name, size, fill, max_width=CARD_SIZE[0] - 120):
+    text, font = fit_text(draw, text, font_name, size, max_width)
+    width = draw.textlength(text, font=font)
+    draw.text(((CARD_SIZE[0] - width) / 2, y), text, font=font, fill=fill)
+
+
+def rounded(image, radius):
+    Image, ImageDraw, _ = pillow()
+    mask = Image.new('L', image.size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, *image.size), radius, fill=255)
+    image.putalpha(mask)
+    return image
+
+
+def render_card(fields, posters, fmt):
+    """Draw the card. posters holds the cover image bytes (or None) for each of fields['posters']"""
+    Image, ImageDraw, _ = pillow()
+    width, height = CARD_SIZE
+    card = Image.new('RGB', CARD_SIZE, BG)
+    draw = ImageDraw.Draw(card)
+
+    # Accent band in the page's orange/green/blue
+    band = width // 3
+    for i, colour in enumerate((ORANGE, GREEN, BLUE)):
+        draw.rectangle((i * band, 0, (i + 1) * band, 12), fill=colour)
+
+    year = fields['year']
+    draw_centered(draw, 70, f'LETTERBOXD WRAPPED {year}', SHARE_CARD_FONT_BOLD, 34, ORANGE)
+    draw_centered(draw, 130, "That's a Wrap!", SHARE_CARD_FONT_BOLD, 88, TEXT)
+    draw_centered(draw, 245, f"{fields['display_name']}'s {year} in film", SHARE_CARD_FONT, 40, TEXT_DIM)
+
+    # Top posters
+    gap, margin = 20, 60
+    poster_w = (width - 2 * margin - 3 * gap) // 4
+    poster_h = poster_w * 3 // 2
+    top = 330
+    for i, film in enumerate(fields['posters']):
+        x = margin + i * (poster_w + gap)
+        image = None
+        if posters[i]:
+            try:
+                image = Image.open(io.BytesIO(posters[i])).convert('RGB').resize((poster_w, poster_h), Image.LANCZOS)
+            except OSError:
+                image = None
+        if image is not None:
+            image = rounded(image, 14)
+            card.paste(image, (x, top), image)
+        else:
+            draw.rounded_rectangle((x, top, x + poster_w, top + poster_h), 14, fill=SURFACE)
+            text, font = fit_text(draw, film['title'], SHARE_CARD_FONT, 24, poster_w - 20, min_size=16)
+            draw.text((x + 10, top + poster_h - 44), text, font=font, fill=TEXT_DIM)
+
+    # Stats
+    hours = fields['hours_watched']
+    stats = [
+        (f"{fields['films_logged'] or 0:,}", 'FILMS', ORANGE),
+        (f"{round(hours):,}" if hours >= 100 else f"{hours or '—'}", 'HOURS', GREEN),
+        (f"★{fields['average_rating']:.1f}" if fields['average_rating'] else '★?', 'AVG RATING', PINK),
+    ]
+    column = (width - 2 * margin) / 3
+    for i, (value, label, colour) in enumerate(stats):
+        centre = margin + column * i + column / 2
+        value_text, value_font = fit_text(draw, value, SHARE_CARD_FONT_BOLD, 96, column - 20)
+        draw.text((centre - draw.textlength(value_text, font=value_font) / 2, 735), value_text,
+                  font=value_font, fill=colour)
+        label_font = load_font(SHARE_CARD_FONT_BOLD, 26)
+        draw.text((centre - draw.textlength(label, font=label_font) / 2, 855), label, font=label_font, fill=TEXT_MUTED)
+
+    draw.line((margin, 930, width - margin, 930), fill=SURFACE, width=3)
+
+    # Personality and era
+    personality = fields['personality']
+    if personality['type']:
+        draw_centered(draw, 965, personality['type'], SHARE_CARD_FONT_BOLD, 60, TEXT)
+        draw_centered(draw, 1040, personality['tagline'], SHARE_CARD_FONT, 34, TEXT_DIM)
+    era = fields['era']
+    if era['era']:
+        draw_centered(draw, 1120, f"Movie era: {era['era']}", SHARE_CARD_FONT_BOLD, 40, ORANGE)
+        draw_centered(draw, 1175, era['subtitle'], SHARE_CARD_FONT, 30, TEXT_DIM)
+
+    draw_centered(draw, height - 70, 'letterboxd wrapped', SHARE_CARD_FONT, 28, TEXT_MUTED)
+
+    out = io.BytesIO()
+    if fmt == 'webp':
+        card.save(out, 'WEBP', quality=SHARE_CARD_QUALITY, method=4)
+    else:
+        card.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+
+class ShareCards:
+    """Renders cards on demand and keeps them on disk, keyed by card_digest
+
+    load_poster(url) returns the image bytes for a poster URL, or None.
+    """
+
+    def __init__(self, load_poster, root=SHARE_CARD_DIR):
+        self.load_poster = load_poster
+        self.root = root
+        # Pillow is optional; without it there is no server-side card
+        self.available = importlib.util.find_spec('PIL') is not None
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'renders': 0}
+
+    def get(self, result, fmt='png'):
+        """Return (digest, content) for a result's card"""
+        fields = card_fields(result)
+        digest = card_digest(fields, fmt)
+        path = os.path.join(self.root, f'{digest}.{fmt}')
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            self._count('hits')
+            return digest, content
+        except OSError:
+            pass
+
+        urls = [film['poster'] for film in fields['posters']]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            posters = list(executor.map(lambda url: self.load_poster(url) if url else None, urls))
+        content = render_card(fields, posters, fmt)
+        self._count('renders')
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        return digest, content
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['available'] = self.available
+        return stats
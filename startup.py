@@ -0,0 +1,46 @@
+"""
+Cold-start timings
+How long a worker took to import the app, warm up, answer its first health
+check and serve its first real request, in seconds from process start
+"""
+
+import os
+import threading
+import time
+
+
+def process_age():
+    """Seconds since this process started (forked, for a gunicorn worker), or None without /proc"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name; starttime (field 22) is in clock ticks since boot
+            started_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - started_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimes:
+    """First-occurrence timings: each phase is recorded once and never overwritten"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # perf_counter's reading at process start; falls back to now when /proc is missing
+        self._origin = time.perf_counter() - (process_age() or 0.0)
+        self.phases = {}
+
+    def mark(self, phase, seconds=None):
+        """Record a phase: its duration when given, else the time since process start"""
+        with self._lock:
+            if phase in self.phases:
+                return False
+            if seconds is None:
+                seconds = time.perf_counter() - self._origin
+            self.phases[phase] = round(seconds, 3)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self.phases)
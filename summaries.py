@@ -0,0 +1,184 @@
+"""
+Per-year summaries for the multi-year (lifetime) wrapped view
+A finished year is summarised once and never recomputed; lifetime totals,
+trends and year-over-year changes are merged from the summaries alone
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from cache import CACHE_DB_PATH
+
+
+def is_final(year, computed_at):
+    """A summary is final once it was computed after its year ended"""
+    return date.fromtimestamp(computed_at).year > int(year)
+
+
+def summarize_year(result):
+    """The parts of a wrapped result the lifetime view merges"""
+    return {
+        'year': result['year'],
+        'films_logged': result.get('films_logged', 0),
+        'hours_watched': result.get('hours_watched', 0),
+        'reviews': result.get('reviews', 0),
+        'likes': result.get('likes', 0),
+        'average_rating': result.get('average_rating', 0),
+        'total_ratings': result.get('total_ratings', 0),
+        'five_star_pct': round(result.get('five_star_pct', 0), 1),
+        'star_distribution': {str(k): v for k, v in (result.get('star_distribution') or {}).items()},
+        'genres': [{'name': g['name'], 'count': g.get('count', 0)} for g in result.get('genres', [])],
+        'countries': [{'name': c['name'], 'count': c.get('count', 0)} for c in result.get('countries', [])],
+        'directors': [d['name'] for d in result.get('directors', [])],
+        'actors': [a['name'] for a in result.get('actors', [])],
+        'top_film': (result.get('top_films') or [{}])[0].get('title'),
+        'personality': (result.get('personality') or {}).get('type'),
+        'movie_era': (result.get('movie_era') or {}).get('era'),
+    }
+
+
+class YearSummaryStore:
+    """SQLite table of (username, year) summaries; final ones are never overwritten"""
+
+    def __init__(self, db_path=CACHE_DB_PATH):
+        self._lock = threading.Lock()
+        if db_path and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path or ':memory:', check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS year_summaries ('
+            ' username TEXT NOT NULL,'
+            ' year INTEGER NOT NULL,'
+            ' summary TEXT NOT NULL,'
+            ' computed_at REAL NOT NULL,'
+            ' PRIMARY KEY (username, year))'
+        )
+        self._db.commit()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def get(self, username, year):
+        """Return the stored summary if it is final, else None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT summary, computed_at FROM year_summaries WHERE username = ? AND year = ?',
+                (username.lower(), int(year))
+            ).fetchone()
+            if row and is_final(year, row[1]):
+                self.counters['hits'] += 1
+                return json.loads(row[0])
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, username, year, summary, computed_at=None):
+        computed_at = computed_at or time.time()
+        with self._lock:
+            # A final summary stays as first computed; anything else is replaced
+            existing = self._db.execute(
+                'SELECT computed_at FROM year_summaries WHERE username = ? AND year = ?',
+                (username.lower(), int(year))
+            ).fetchone()
+            if existing and is_final(year, existing[0]):
+                return
+            self._db.execute(
+                'INSERT OR REPLACE INTO year_summaries (username, year, summary, computed_at) VALUES (?, ?, ?, ?)',
+                (username.lower(), int(year), json.dumps(summary, ensure_ascii=False), computed_at)
+            )
+            self._db.commit()
+            self.counters['stores'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = self._db.execute('SELECT COUNT(*) FROM year_summaries').fetchone()[0]
+            return stats
+
+
+def ranked_totals(per_year, limit):
+    """Sum {'name', 'count'} lists across years into one ranked list"""
+    totals = {}
+    for items in per_year:
+        for item in items:
+            totals[item['name']] = totals.get(item['name'], 0) + item.get('count', 0)
+    ranked = sorted(totals.items(), key=lambda kv: -kv[1])[:limit]
+    return [{'name': name, 'count': count} for name, count in ranked]
+
+
+def ranked_names(per_year, limit):
+    """Merge per-year ranked name lists: a higher rank in more years scores higher"""
+    scores = {}
+    years = {}
+    for names in per_year:
+        for rank, name in enumerate(names):
+            scores[name] = scores.get(name, 0) + len(names) - rank
+            years[name] = years.get(name, 0) + 1
+    ranked = sorted(scores, key=lambda name: -scores[name])[:limit]
+    return [{'name': name, 'years': years[name]} for name in ranked]
+
+
+def year_over_year(previous, current):
+    """What changed between two consecutive summaries"""
+    def top(summary, key, n=5):
+        return [item['name'] if isinstance(item, dict) else item for item in summary[key][:n]]
+
+    prev_genres, cur_genres = top(previous, 'genres'), top(current, 'genres')
+    prev_directors, cur_directors = top(previous, 'directors'), top(current, 'directors')
+    return {
+        'from': previous['year'],
+        'to': current['year'],
+        'films_logged': current['films_logged'] - previous['films_logged'],
+        'hours_watched': round(current['hours_watched'] - previous['hours_watched'], 1),
+        'average_rating': round((current['average_rating'] or 0) - (previous['average_rating'] or 0), 2),
+        'top_genre': {'from': prev_genres[0] if prev_genres else None,
+                      'to': cur_genres[0] if cur_genres else None},
+        'genres_in': [g for g in cur_genres if g not in prev_genres],
+        'genres_out': [g for g in prev_genres if g not in cur_genres],
+        'new_directors': [d for d in cur_directors if d not in prev_directors],
+    }
+
+
+def merge_summaries(summaries):
+    """Lifetime totals, per-year trend lines and year-over-year changes from summaries"""
+    summaries = sorted(summaries, key=lambda s: s['year'])
+    total_ratings = sum(s['total_ratings'] for s in summaries)
+    weighted = sum(s['average_rating'] * s['total_ratings'] for s in summaries)
+
+    stars = {}
+    for s in summaries:
+        for star, count in s['star_distribution'].items():
+            stars[star] = stars.get(star, 0) + count
+
+    lifetime = {
+        'years': len(summaries),
+        'films_logged': sum(s['films_logged'] for s in summaries),
+        'hours_watched': round(sum(s['hours_watched'] for s in summaries), 1),
+        'reviews': sum(s['reviews'] for s in summaries),
+        'likes': sum(s['likes'] for s in summaries),
+        'total_ratings': total_ratings,
+        'average_rating': round(weighted / total_ratings, 2) if total_ratings else 0,
+        'star_distribution': stars,
+        'genres': ranked_totals([s['genres'] for s in summaries], 10),
+        'countries': ranked_totals([s['countries'] for s in summaries], 5),
+        'directors': ranked_names([s['directors'] for s in summaries], 10),
+        'actors': ranked_names([s['actors'] for s in summaries], 10),
+    }
+    if summaries:
+        lifetime['busiest_year'] = max(summaries, key=lambda s: s['films_logged'])['year']
+
+    trends = {
+        'years': [s['year'] for s in summaries],
+        'films_logged': [s['films_logged'] for s in summaries],
+        'hours_watched': [s['hours_watched'] for s in summaries],
+        'average_rating': [s['average_rating'] for s in summaries],
+        'five_star_pct': [s['five_star_pct'] for s in summaries],
+        'top_genre': [s['genres'][0]['name'] if s['genres'] else None for s in summaries],
+    }
+
+    return {
+        'lifetime': lifetime,
+        'trends': trends,
+        'year_over_year': [year_over_year(a, b) for a, b in zip(summaries, summaries[1:])],
+    }